@@ -3,17 +3,19 @@ from rest_framework.views import APIView
 from django.http import JsonResponse
 from django.conf import settings
 import httpx
-from users.crypt import encrypt_with_fingerprint, decrypt_with_fingerprint
-from pymongo import MongoClient
+from users.crypt import encrypt_with_fingerprint, decrypt_with_fingerprint, decrypt_many, message_digest
+from . import cache_writer, chat_store, crosswalk, llm, mongo, mos_match, prompts, search_index
+from .pagination import InvalidCursor, page_limit, paginate
+from .pipeline import Stage, run_pipeline
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 import os
 import json
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 import requests
 from urllib.parse import urlparse
 from bs4 import BeautifulSoup
 import time
-import re
 
 def chatbot_view(request):
     user_id = request.user.id if request.user.is_authenticated else "guest"
@@ -34,27 +36,30 @@ class BookmarkMessage(APIView):
             # Encrypt the message
             data_to_encrypt = {"message": message}
             encrypted_message = encrypt_with_fingerprint(data_to_encrypt, user.fingerprint)["message"]
+            # Ciphertexts are randomized, so duplicates are matched on a keyed digest of the plaintext
+            digest = message_digest(message, user.fingerprint)
 
             # Connect to MongoDB
-            client = MongoClient(settings.MONGO_URI)
-            db = client[settings.MONGO_DB_NAME]
+            db = mongo.get_db()
             bookmarks = db["bookmarks"]
 
-            # Check for duplicate
-            exists = bookmarks.find_one({
-                "fingerprint": user.fingerprint,
-                "message": encrypted_message
-            })
-
-            if exists:
+            # Insert unless it already exists, in one indexed round-trip
+            try:
+                result = bookmarks.update_one(
+                    {"fingerprint": user.fingerprint, "digest": digest},
+                    {"$setOnInsert": {"message": encrypted_message, "created_at": datetime.utcnow()}},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                result = None
+            if result is None or result.upserted_id is None:
                 return JsonResponse({"error": "This bookmark already exists."}, status=409)
 
-            # Insert new bookmark
-            bookmarks.insert_one({
-                "fingerprint": user.fingerprint,
-                "message": encrypted_message,
-                "created_at": datetime.utcnow()
-            })
+            # The bookmark is saved; a failed index write must not turn that into an error
+            try:
+                search_index.index_text(db, user.fingerprint, "bookmark", result.upserted_id, message)
+            except Exception as e:
+                print(f"Search indexing failed for bookmark {result.upserted_id}: {e}")
 
             return JsonResponse({"message": "Bookmark saved successfully"}, status=201)
 
@@ -71,63 +76,37 @@ class BookmarkedChats(APIView):
         if not user.fingerprint:
             return JsonResponse({"error": "Missing 'fingerprint' in query parameters."}, status=400, safe=False)
 
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
+        db = mongo.get_db()
         bookmarks = db["bookmarks"]
 
-        # Fetch and convert cursor to list
-        chats = list(bookmarks.find({"fingerprint": user.fingerprint}))
+        # One page at a time, newest first; only that page is decrypted
+        try:
+            chats, next_cursor = paginate(
+                bookmarks, "fingerprint", user.fingerprint, "created_at",
+                cursor=request.data.get("cursor"), limit=page_limit(request.data.get("limit"))
+            )
+        except InvalidCursor as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        messages = decrypt_many([chat["message"] for chat in chats], user.fingerprint)
 
         # Optional: remove ObjectId for JSON serialization
-        for chat in chats:
+        for chat, message in zip(chats, messages):
             chat["_id"] = str(chat["_id"])
-            chat["message"] = decrypt_with_fingerprint({"message": chat["message"]}, user.fingerprint)["message"]
+            chat["message"] = message
             del chat["fingerprint"]
-        
-        return JsonResponse(chats, safe=False)
+
+        return JsonResponse({"results": chats, "next_cursor": next_cursor})
 
 
 class VeteranJobSearchView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def extract_structured_job_info(self, visible_text, keywords):
-        prompt = (
-            "You are a structured data extractor that parses plain text job descriptions. "
-            "Given a job posting's plain text content, return a JSON object with the following normalized fields:\n\n"
-            "- `company_name`: string\n"
-            "- `job_title`: string\n"
-            "- `location`: string\n"
-            "- `description`: a short 2-3 line summary\n"
-            "- `job_tags`: array of up to 5 keywords/skills\n"
-            "- `posted_time`: ISO date format (`YYYY-MM-DD`) if mentioned\n"
-            "- `applicants`: integer (e.g., `18` from '18 applicants')\n"
-            "- `salary`: normalized object like `{ \"from\": 85000, \"to\": 100000 }` in **USD per year**\n"
-            "   - If only one value is mentioned, use it for both `from` and `to`\n"
-            "   - Accept ranges like '$80k-$100k', '$85,000/year', or 'up to $95,000'\n"
-            "- `employment_type`: string like 'Full-time', 'Part-time', etc.\n"
-            "- `work_mode`: one of `Remote`, `Hybrid`, or `On-site`\n\n"
-            "Return only the JSON object. If data is missing, set values to `null` or an empty list.\n\n"
-            "Job text:\n"
-            f"{visible_text}"
-        )
-        llama_data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that extracts structured job info from HTML."},
-                {"role": "user", "content": prompt}
-            ]
-        }
+    async def extract_structured_job_info(self, visible_text):
+        messages = prompts.JOB_EXTRACT.messages(visible_text=visible_text)
         try:
-            resp = requests.post(
-                settings.GROQ_API_URL,
-                json=llama_data,
-                headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"},
-                timeout=60
-            )
-            resp.raise_for_status()
-            output = resp.json()["choices"][0]["message"]["content"]
-            match = re.search(r'\{.*\}', output, re.DOTALL)
-            return json.loads(match.group(0)) if match else json.loads(output)
+            output = await llm.achat_completion(messages, task='extract')
+            return llm.parse_json_object(output)
         except Exception as e:
             print(f"Failed to extract structured job info: {e}")
             return {
@@ -137,12 +116,79 @@ class VeteranJobSearchView(APIView):
                 "description": None,
                 "job_tags": []
             }
-        
+
+    async def crawl_job(self, client, item):
+        url = item.get('link')
+        if not url:
+            return None
+        resp = await client.get(url)
+        html = resp.text
+        if 'Cloudflare' in html:
+            raise Exception(f"Blocked by bot protection: {url}")
+        soup = BeautifulSoup(html, 'html.parser')
+        visible_text = soup.get_text(separator='\n', strip=True)
+        return {"url": url, "visible_text": visible_text[:20000]}
+
+    async def extract_job(self, crawled):
+        url = crawled["url"]
+        structured = await self.extract_structured_job_info(crawled["visible_text"])
+        critical_fields = [
+            structured.get("company_name"),
+            structured.get("job_title"),
+            structured.get("location"),
+            structured.get("description"),
+            structured.get("salary"),
+            structured.get("employment_type"),
+            structured.get("work_mode"),
+        ]
+        null_count = sum(1 for field in critical_fields if field in [None, '', [], {}])
+        if null_count >= 3:
+            print(f"Job skipped due to too many null fields: {url}")
+            return None
+        return {
+            "company_name": structured.get("company_name"),
+            "job_title": structured.get("job_title"),
+            "location": structured.get("location"),
+            "job_tags": structured.get("job_tags", []),
+            "posted_time": structured.get("posted_time"),
+            "applicants": structured.get("applicants"),
+            "salary": structured.get("salary"),
+            "employment_type": structured.get("employment_type"),
+            "work_mode": structured.get("work_mode"),
+            "url": url,
+            "description": structured.get("description"),
+        }
+
+    async def score_job(self, profile_json, job):
+        job_messages = prompts.JOB_SCORE.messages(profile=profile_json, job=json.dumps(job, indent=2))
+        try:
+            match_json = await llm.achat_completion(job_messages, task='score')
+            match_data = llm.parse_json_object(match_json)
+            job['matching_score'] = match_data.get('score')
+            job['matching_label'] = match_data.get('label')
+        except Exception:
+            job['matching_score'] = None
+            job['matching_label'] = None
+        return job
+
+    async def run_job_pipeline(self, linkedin_jobs, profile):
+        """
+        Crawl -> extract -> score, with each stage bounded by settings.JOB_SEARCH_CONCURRENCY.
+        """
+        profile_json = json.dumps(profile, indent=2)
+        concurrency = settings.JOB_SEARCH_CONCURRENCY
+        async with httpx.AsyncClient(timeout=settings.JOB_SEARCH_CRAWL_TIMEOUT, follow_redirects=True) as crawler:
+            stages = [
+                Stage('crawl', lambda item: self.crawl_job(crawler, item), concurrency['crawl']),
+                Stage('extract', self.extract_job, concurrency['extract']),
+                Stage('score', lambda job: self.score_job(profile_json, job), concurrency['score']),
+            ]
+            return await run_pipeline(linkedin_jobs, stages)
+
     def post(self, request):
         user = request.user
         # 1. Load dummy profile and MOS DB
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
+        db = mongo.get_db()
         user_collection = db["user_data"]
         user_doc = user_collection.find_one({'fingerprint': user.fingerprint})
         user_doc = decrypt_with_fingerprint(user_doc, user.fingerprint)
@@ -151,69 +197,31 @@ class VeteranJobSearchView(APIView):
         profile = user_doc
         del profile["_id"]
 
-        # Fetch MOS DB
-        mos_doc = db["mos_doc"]
-        mos_docs = mos_doc.find({})
-        mos_db_list = list(mos_docs)
-        if not mos_db_list:
-            # Load local JSON file and insert into MongoDB
-            base_dir = os.path.dirname(__file__)
-            json_path = os.path.join(base_dir, 'utils/data/mos_database.json')
-
-            try:
-                with open(json_path, 'r') as f:
-                    mos_data = json.load(f)
-                    if isinstance(mos_data, list):
-                        mos_doc.insert_many(mos_data)
-                        mos_db_list = mos_data  # use directly for downstream logic
-                    else:
-                        return JsonResponse({'error': 'Invalid format in mos_database.json'}, status=500)
-            except Exception as e:
-                return JsonResponse({'error': f'Failed to load mos_database.json: {str(e)}'}, status=500)
-
-        mos_db = {item['code']: item for item in mos_db_list}
-            
-        # Enrich MOS history
+        # Enrich MOS history; noisy codes and titles resolve to the closest registry entry
         for mos in profile.get('mos_history', []):
-            code = mos.get('code')
-            if not code:
+            if not mos.get('code') and not mos.get('title'):
                 continue
-            mos_info = mos_db.get(code, {})
-            mos['title'] = mos_info.get('title', mos.get('title'))
-            mos['description'] = mos_info.get('description', '')
-
-        # 2. Generate summary + keywords with LLaMA
-        prompt = (
-            "You are an expert at translating military experience to civilian terms. "
-            "Given the following profile, summarize it for a civilian audience and generate a list of relevant skills/keywords for job search. "
-            "Return a JSON object with 'summary' and 'keywords' (array of strings).\n"
-            f"Profile: {json.dumps(profile, indent=2)}"
-        )
-        llama_data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant for U.S. military veterans."},
-                {"role": "user", "content": prompt}
-            ]
-        }
+            if mos_match.enrich(mos) is None:
+                mos['description'] = ''
 
-        try:
-            resp = requests.post(settings.GROQ_API_URL, json=llama_data,
-                                 headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"}, timeout=60)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"]
-            match = re.search(r'\{.*\}', content, re.DOTALL)
-            summary_keywords = json.loads(match.group(0)) if match else json.loads(content)
-        except Exception:
-            summary_keywords = {"summary": "", "keywords": []}
+        # 2. Keywords from the local MOS crosswalk; the LLM only fills in for thin profiles
+        keywords = crosswalk.profile_keywords(profile)
+        if len(keywords) < settings.MOS_CROSSWALK_MIN_KEYWORDS:
+            messages = prompts.JOB_KEYWORDS.messages(profile=json.dumps(profile, indent=2))
 
-        keywords = summary_keywords.get('keywords') or [
-            mos.get('title', '') for mos in profile.get('mos_history', [])
-        ]
+            try:
+                content = llm.chat_completion(messages, task='keywords')
+                summary_keywords = llm.parse_json_object(content)
+            except Exception:
+                summary_keywords = {"summary": "", "keywords": []}
+
+            keywords = summary_keywords.get('keywords') or [
+                mos.get('title', '') for mos in profile.get('mos_history', [])
+            ]
 
         # 3. Search via SerpAPI (LinkedIn only)
         serpapi_key = getattr(settings, 'SERPAPI_KEY', None)
-        jobs = []
+        linkedin_jobs = []
 
         if serpapi_key:
             query = ' '.join(keywords[:3]) if keywords else ''
@@ -231,105 +239,18 @@ class VeteranJobSearchView(APIView):
                     item for item in serp_data.get('organic_results', [])
                     if 'linkedin.com/jobs/view/' in item.get('link', '')
                 ]
-
-                for item in linkedin_jobs:
-                    url = item.get('link')
-                    if not url:
-                        continue
-                    try:
-                        html = requests.get(url, timeout=10).text
-                        if 'Cloudflare' in html:
-                            raise Exception("Blocked by bot protection")
-                        soup = BeautifulSoup(html, 'html.parser')
-                        visible_text = soup.get_text(separator='\n', strip=True)
-                        if len(visible_text) > 20000:
-                            visible_text = visible_text[:20000]
-                        structured = self.extract_structured_job_info(visible_text, keywords)
-                        critical_fields = [
-                            structured.get("company_name"),
-                            structured.get("job_title"),
-                            structured.get("location"),
-                            structured.get("description"),
-                            structured.get("salary"),
-                            structured.get("employment_type"),
-                            structured.get("work_mode"),
-                        ]
-                        null_count = sum(1 for field in critical_fields if field in [None, '', [], {}])
-
-                        if null_count < 3:
-                            jobs.append({
-                                "company_name": structured.get("company_name"),
-                                "job_title": structured.get("job_title"),
-                                "location": structured.get("location"),
-                                "job_tags": structured.get("job_tags", []),
-                                "posted_time": structured.get("posted_time"),
-                                "applicants": structured.get("applicants"),
-                                "salary": structured.get("salary"),
-                                "employment_type": structured.get("employment_type"),
-                                "work_mode": structured.get("work_mode"),
-                                "url": url,
-                                "description": structured.get("description"),
-                            })
-                        else:
-                            print(f"Job skipped due to too many null fields: {url}")
-                    except Exception as e:
-                        print(f"Error crawling {url}: {e}")
             except Exception as e:
                 print(f"SerpAPI error: {e}")
 
-        # 4. Score and rank with LLaMA
-        scored_jobs = []
-        for job in jobs:
-            job_prompt = (
-                "Given the following veteran profile and job posting, evaluate how well the job matches the profile. "
-                "Return a JSON object with:\n"
-                "- `score`: a numeric value between 0 and 100 (e.g., 87, but not multiples of 5), based on relevance\n"
-                "- `label`: one of `GOOD MATCH`, `OK MATCH`, or `LOW MATCH`, based on the score\n\n"
-                "Scoring scale:\n"
-                "- 80 and above → GOOD MATCH\n"
-                "- 50 to 79.9 → OK MATCH\n"
-                "- below 50 → LOW MATCH\n\n"
-                f"Profile:\n{json.dumps(profile, indent=2)}\n\n"
-                f"Job:\n{json.dumps(job, indent=2)}"
-            )
-
-            job_data = {
-                "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-                "messages": [
-                    {"role": "system", "content": "You are a helpful assistant for U.S. military veterans."},
-                    {"role": "user", "content": job_prompt}
-                ]
-            }
-            try:
-                match_resp = requests.post(settings.GROQ_API_URL, json=job_data,
-                                           headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"}, timeout=30)
-                match_resp.raise_for_status()
-                match_json = match_resp.json()["choices"][0]["message"]["content"]
-                match = re.search(r'\{.*\}', match_json, re.DOTALL)
-                match_data = json.loads(match.group(0)) if match else json.loads(match_json)
-                job['matching_score'] = match_data.get('score')
-                job['matching_label'] = match_data.get('label')
-            except Exception:
-                job['matching_score'] = None
-                job['matching_label'] = None
-            scored_jobs.append(job)
+        # 4. Crawl, extract and score every hit concurrently
+        # On the shared LLM loop, so the pooled client's connections carry over between searches
+        scored_jobs = llm.run_sync(self.run_job_pipeline(linkedin_jobs, profile))
 
         # 5. Sort and return
         scored_jobs.sort(key=lambda x: (x['matching_score'] is not None, x['matching_score']), reverse=True)
 
-        from copy import deepcopy
-        response_jobs = deepcopy(scored_jobs)
-
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
-        cache_db = db["cache_job_db"]
-
-        for job in scored_jobs:
-            job["scraped_at"] = datetime.utcnow().isoformat()
-            job["fingerprint"] = user.fingerprint
-            if not cache_db.find_one({"url": job["url"], "fingerprint": user.fingerprint}):
-                cache_db.insert_one(job)
-        return JsonResponse(response_jobs, safe=False)
+        cache_writer.schedule_results("cache_job_db", scored_jobs, "url", user.fingerprint)
+        return JsonResponse(scored_jobs, safe=False)
 
     
 class FetchChats(APIView):
@@ -337,19 +258,78 @@ class FetchChats(APIView):
 
     def post(self, request):
         user = request.user
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
-        chats_db = db["chat_history"]
+        db = mongo.get_db()
 
-        # Fetch and convert cursor to list
-        chats = list(chats_db.find({"user_id": user.fingerprint}))
+        # A user has a single chat_history header (messages live in chat_buckets),
+        # so there is nothing to page through: only the header and the opening message
+        chats = list(db["chat_history"].find({"user_id": user.fingerprint}, {"conversation": 0}).limit(1))
         for chat in chats:
             chat["created_at"] = chat["created_at"].isoformat()
             chat["updated_at"] = chat["updated_at"].isoformat()
-            chat["conversation"] = decrypt_with_fingerprint(chat["conversation"][0], user.fingerprint)
+            first = chat_store.first_message(db, user.fingerprint)
+            chat["conversation"] = decrypt_with_fingerprint(first, user.fingerprint) if first else None
             del chat["_id"]
-        
-        return JsonResponse(chats, safe=False)
+
+        return JsonResponse({"results": chats})
+
+class SearchChats(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        query = (request.data.get("q") or "").strip()
+        source = request.data.get("source") or "all"
+        if not query:
+            return JsonResponse({"error": "Missing search query"}, status=400)
+        if source != "all" and source not in search_index.SOURCES:
+            return JsonResponse({"error": "Unknown search source"}, status=400)
+        sources = search_index.SOURCES if source == "all" else (source,)
+
+        db = mongo.get_db()
+
+        # Resolve one page of ids from the blind index, then decrypt only the hits
+        try:
+            refs, next_cursor = search_index.search_refs(
+                db, user.fingerprint, query, sources,
+                limit=page_limit(request.data.get("limit")), cursor=request.data.get("cursor")
+            )
+        except InvalidCursor as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        chat_hits = chat_store.messages_by_seq(db, user.fingerprint, [ref for src, ref in refs if src == "chat"])
+        bookmark_hits = {
+            doc["_id"]: doc
+            for doc in db["bookmarks"].find({
+                "fingerprint": user.fingerprint,
+                "_id": {"$in": [ref for src, ref in refs if src == "bookmark"]}
+            })
+        }
+
+        results = []
+        for src, ref in refs:
+            if src == "chat" and ref in chat_hits:
+                msg = decrypt_with_fingerprint(chat_hits[ref], user.fingerprint)
+                results.append({"source": src, "id": ref, "role": msg.get("role"), "message": msg.get("message")})
+            elif src == "bookmark" and ref in bookmark_hits:
+                doc = decrypt_with_fingerprint(bookmark_hits[ref], user.fingerprint)
+                results.append({
+                    "source": src,
+                    "id": str(ref),
+                    "message": doc.get("message"),
+                    "created_at": doc["created_at"].isoformat() if doc.get("created_at") else None
+                })
+
+        return JsonResponse({"results": results, "next_cursor": next_cursor})
+
+class MongoHealthView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        status = mongo.health()
+        # Pool counters are operational detail; only staff get them
+        if not request.user.is_staff:
+            status.pop("pools")
+            status.pop("error", None)
+        return JsonResponse(status, status=200 if status["ok"] else 503)
 
 class FetchRelJobs(APIView):
     permission_classes = [IsAuthenticated]
@@ -363,8 +343,7 @@ class FetchRelJobs(APIView):
 
         try:
             # Connect to MongoDB
-            client = MongoClient(settings.MONGO_URI)
-            db = client[settings.MONGO_DB_NAME]
+            db = mongo.get_db()
             cache_collection = db["cache_job_db"]
 
             # Fetch jobs related to the user
@@ -379,36 +358,10 @@ class VeteranMentorSearchView(APIView):
     permission_classes = [IsAuthenticated]
 
     def extract_structured_mentor_info(self, visible_text, keywords):
-        prompt = (
-            "You are a structured data extractor that parses plain text professional profiles. "
-            "Given a mentor or professional's plain text content, return a JSON object with the following normalized fields:\n\n"
-            "- `name`: string\n"
-            "- `title`: string (e.g., 'Senior Software Engineer', 'Career Coach')\n"
-            "- `expertise`: array of up to 5 keywords/skills/areas of guidance\n"
-            "- `profile_url`: string (if available)\n"
-            "- `summary`: a short 2-3 line bio written in **third person**, not in first person (avoid 'I', 'my', 'me').\n\n"
-            "Return only the JSON object. If data is missing, set values to `null` or an empty list.\n\n"
-            "Profile text:\n"
-            f"{visible_text}"
-        )
-        llama_data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that extracts structured mentor info from HTML."},
-                {"role": "user", "content": prompt}
-            ]
-        }
+        messages = prompts.MENTOR_EXTRACT.messages(visible_text=visible_text)
         try:
-            resp = requests.post(
-                settings.GROQ_API_URL,
-                json=llama_data,
-                headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"},
-                timeout=60
-            )
-            resp.raise_for_status()
-            output = resp.json()["choices"][0]["message"]["content"]
-            match = re.search(r'\{.*\}', output, re.DOTALL)
-            return json.loads(match.group(0)) if match else json.loads(output)
+            output = llm.chat_completion(messages, task='extract')
+            return llm.parse_json_object(output)
         except Exception as e:
             print(f"Failed to extract structured mentor info: {e}")
             return {
@@ -422,8 +375,7 @@ class VeteranMentorSearchView(APIView):
     def post(self, request):
         user = request.user
         # 1. Load user profile
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
+        db = mongo.get_db()
         user_collection = db["user_data"]
         user_doc = user_collection.find_one({'fingerprint': user.fingerprint})
         user_doc = decrypt_with_fingerprint(user_doc, user.fingerprint)
@@ -432,33 +384,24 @@ class VeteranMentorSearchView(APIView):
         profile = user_doc
         del profile["_id"]
 
-        # 2. Generate summary + keywords with LLaMA
-        prompt = (
-            "You are an expert at translating military experience to civilian terms. "
-            "Given the following profile, summarize it for a civilian audience and generate a list of relevant skills/keywords for mentorship search. "
-            "Return a JSON object with 'summary' and 'keywords' (array of strings).\n"
-            f"Profile: {json.dumps(profile, indent=2)}"
-        )
-        llama_data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant for U.S. military veterans."},
-                {"role": "user", "content": prompt}
-            ]
-        }
-        try:
-            resp = requests.post(settings.GROQ_API_URL, json=llama_data,
-                                 headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"}, timeout=60)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"]
-            match = re.search(r'\{.*\}', content, re.DOTALL)
-            summary_keywords = json.loads(match.group(0)) if match else json.loads(content)
-        except Exception:
-            summary_keywords = {"summary": "", "keywords": []}
+        # Resolve noisy or legacy MOS codes first, as for job search, so the crosswalk knows them
+        for mos in profile.get('mos_history', []):
+            if mos.get('code') or mos.get('title'):
+                mos_match.enrich(mos)
 
-        keywords = summary_keywords.get('keywords') or [
-            mos.get('title', '') for mos in profile.get('mos_history', [])
-        ]
+        # 2. Keywords from the local MOS crosswalk; the LLM only fills in for thin profiles
+        keywords = crosswalk.profile_keywords(profile)
+        if len(keywords) < settings.MOS_CROSSWALK_MIN_KEYWORDS:
+            messages = prompts.MENTOR_KEYWORDS.messages(profile=json.dumps(profile, indent=2))
+            try:
+                content = llm.chat_completion(messages, task='keywords')
+                summary_keywords = llm.parse_json_object(content)
+            except Exception:
+                summary_keywords = {"summary": "", "keywords": []}
+
+            keywords = summary_keywords.get('keywords') or [
+                mos.get('title', '') for mos in profile.get('mos_history', [])
+            ]
 
         # 3. Search for mentors via SerpAPI (LinkedIn, etc.)
         serpapi_key = getattr(settings, 'SERPAPI_KEY', None)
@@ -491,19 +434,8 @@ class VeteranMentorSearchView(APIView):
             except Exception as e:
                 print(f"SerpAPI error: {e}")
 
-            from copy import deepcopy
-            response_mentors = deepcopy(mentors)
-
-            client = MongoClient(settings.MONGO_URI)
-            db = client[settings.MONGO_DB_NAME]
-            cache_db = db["cache_mentor_db"]
-
-            for job in mentors:
-                job["scraped_at"] = datetime.utcnow().isoformat()
-                job["fingerprint"] = user.fingerprint
-                if not cache_db.find_one({"url": job["profile_url"], "fingerprint": user.fingerprint}):
-                    cache_db.insert_one(job)
-        return JsonResponse(response_mentors, safe=False)
+            cache_writer.schedule_results("cache_mentor_db", mentors, "profile_url", user.fingerprint)
+        return JsonResponse(mentors, safe=False)
 
 class FetchRelMentors(APIView):
     permission_classes = [IsAuthenticated]
@@ -517,8 +449,7 @@ class FetchRelMentors(APIView):
 
         try:
             # Connect to MongoDB
-            client = MongoClient(settings.MONGO_URI)
-            db = client[settings.MONGO_DB_NAME]
+            db = mongo.get_db()
             cache_collection = db["cache_mentor_db"]
 
             # Fetch jobs related to the user
@@ -533,39 +464,10 @@ class VeteranCommunitySearchView(APIView):
     permission_classes = [IsAuthenticated]
 
     def extract_structured_event_info(self, visible_text):
-        prompt = (
-            "You are a structured data extractor that parses plain text about community events and services for veterans. "
-            "Return a JSON object with these normalized fields:\n"
-            "- `name`: string (event/service name)\n"
-            "- `description`: 2-3 line summary\n"
-            "- `type`: one of ['Event', 'Support Service', 'benefit_program']\n"
-            "- `location`: string (city/state or Online) if available\n"
-            "- `date`: ISO format YYYY-MM-DD if available\n"
-            "- `time`: starting HH:MM am/pm if available. No need ending\n"
-            "- `contact`: string (email, phone) if available\n"
-            "- `audience`: string (e.g., 'All veterans', 'Female veterans', etc.)\n"
-            "- `tags`: array of up to 3 relevant keywords\n"
-            "Return only the JSON object.\n\n"
-            f"Content:\n{visible_text}"
-        )
-        llama_data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that extracts structured event data for veterans."},
-                {"role": "user", "content": prompt}
-            ]
-        }
+        messages = prompts.EVENT_EXTRACT.messages(visible_text=visible_text)
         try:
-            resp = requests.post(
-                settings.GROQ_API_URL,
-                json=llama_data,
-                headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"},
-                timeout=60
-            )
-            resp.raise_for_status()
-            output = resp.json()["choices"][0]["message"]["content"]
-            match = re.search(r'\{.*\}', output, re.DOTALL)
-            return json.loads(match.group(0)) if match else json.loads(output)
+            output = llm.chat_completion(messages, task='extract')
+            return llm.parse_json_object(output)
         except Exception as e:
             print(f"Failed to extract structured community info: {e}")
             return {}
@@ -574,8 +476,7 @@ class VeteranCommunitySearchView(APIView):
         user = request.user
 
         # Load user profile
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
+        db = mongo.get_db()
         user_collection = db["user_data"]
         user_doc = user_collection.find_one({'fingerprint': user.fingerprint})
         user_doc = decrypt_with_fingerprint(user_doc, user.fingerprint)
@@ -611,17 +512,10 @@ class VeteranCommunitySearchView(APIView):
                     results.append(structured)
             except Exception as e:
                 print(f"SerpAPI error: {e}")
-            from copy import deepcopy
-            response_results = deepcopy(results)
             # Cache in DB
-            community_db = db["cache_community_db"]
-            for result in results:
-                result["fingerprint"] = user.fingerprint
-                result["scraped_at"] = datetime.utcnow().isoformat()
-                if not community_db.find_one({"link": result["link"], "fingerprint": user.fingerprint}):
-                    community_db.insert_one(result)
+            cache_writer.schedule_results("cache_community_db", results, "link", user.fingerprint)
 
-        return JsonResponse(response_results, safe=False)
+        return JsonResponse(results, safe=False)
 
 class FetchRelEvents(APIView):
     permission_classes = [IsAuthenticated]
@@ -635,8 +529,7 @@ class FetchRelEvents(APIView):
 
         try:
             # Connect to MongoDB
-            client = MongoClient(settings.MONGO_URI)
-            db = client[settings.MONGO_DB_NAME]
+            db = mongo.get_db()
             cache_collection = db["cache_community_db"]
 
             # Fetch jobs related to the user
@@ -654,8 +547,7 @@ class VeteranBioDataView(APIView):
         user = request.user
 
         # 1. Load user profile
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
+        db = mongo.get_db()
         user_collection = db["user_data"]
         user_doc = user_collection.find_one({'fingerprint': user.fingerprint})
         user_doc = decrypt_with_fingerprint(user_doc, user.fingerprint)
@@ -666,42 +558,11 @@ class VeteranBioDataView(APIView):
         del profile["_id"]
 
         # 2. Construct prompt for LLaMA to generate enriched civilian bio-data
-        prompt = (
-            "You are an expert career assistant helping U.S. military veterans transition to civilian careers. "
-            "Given the military background and personal profile below, write a JSON resume summary. "
-            "Translate the experience into clear civilian terms and provide a well-structured biography.\n"
-            "Include these fields in the JSON response:\n"
-            "- `full_name`: string\n"
-            "- `headline`: string (short title or role summary)\n"
-            "- `summary`: string (3-5 line bio in third person)\n"
-            "- `skills`: array of key skills (4-5)\n"
-            "- `education`: string (school and degree if known)\n"
-            "- `experience_summary`: string (overview of work history)\n"
-            "- `experience_details`: array of experience objects with `role`, `organization`, `duration`, and `description`\n"
-            "- `achievements`: array of notable achievements or recognitions\n"
-            "- `certifications`: array of any known certifications (if mentioned)\n"
-            "- `volunteer_experience`: string (if relevant)\n"
-            "Return only the JSON object.\n\n"
-            f"Veteran Profile:\n{json.dumps(profile, indent=2)}"
-        )
-
-        llama_data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that generates enriched bios for veterans."},
-                {"role": "user", "content": prompt}
-            ]
-        }
+        messages = prompts.BIO.messages(profile=json.dumps(profile, indent=2))
 
         try:
-            resp = requests.post(settings.GROQ_API_URL,
-                                 json=llama_data,
-                                 headers={"Authorization": f"Bearer {settings.GROQ_API_KEY}"},
-                                 timeout=60)
-            resp.raise_for_status()
-            content = resp.json()["choices"][0]["message"]["content"]
-            match = re.search(r'\{.*\}', content, re.DOTALL)
-            biodata = json.loads(match.group(0)) if match else json.loads(content)
+            content = llm.chat_completion(messages, task='bio')
+            biodata = llm.parse_json_object(content)
         except Exception as e:
             print(f"Bio generation failed: {e}")
             return JsonResponse({'error': 'Failed to generate bio-data.'}, status=500)
@@ -726,8 +587,7 @@ class VeteranBioPDFView(APIView):
         user = request.user
 
         # 1. Load bio-data from MongoDB using fingerprint
-        client = MongoClient(settings.MONGO_URI)
-        db = client[settings.MONGO_DB_NAME]
+        db = mongo.get_db()
         bio_collection = db["bio_data"]
         biodata = bio_collection.find_one({"fingerprint": user.fingerprint})
 
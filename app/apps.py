@@ -1,6 +1,23 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def _bootstrap_indexes():
+    from . import mongo, mongo_indexes
+
+    report = mongo_indexes.ensure_indexes(mongo.get_db())
+    for section in ('created', 'conflicting', 'errors'):
+        for entry in report[section]:
+            print(f"[mongo_indexes] {section}: {entry}")
 
 
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        if settings.MONGO_ENSURE_INDEXES_ON_STARTUP:
+            # Off the startup path: a slow or unreachable Mongo must not block boot
+            threading.Thread(target=_bootstrap_indexes, name='mongo-indexes', daemon=True).start()
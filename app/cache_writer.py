@@ -0,0 +1,75 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.conf import settings
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from . import mongo
+
+# Search views cache every result per user. A batch becomes one unordered
+# bulk_write of upserts keyed on (key_field, fingerprint), served by the
+# indexes in app/mongo_indexes.py. Existing entries are left as first scraped.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SEARCH_CACHE_WRITE_WORKERS, thread_name_prefix='cache-writer'
+                )
+    return _executor
+
+
+def build_upserts(items, key_field, fingerprint):
+    scraped_at = datetime.utcnow().isoformat()
+    requests = {}
+    for item in items:
+        key = item.get(key_field)
+        if key is None or key in requests:
+            continue
+        doc = dict(item, fingerprint=fingerprint, scraped_at=scraped_at)
+        doc.pop('_id', None)
+        requests[key] = UpdateOne(
+            {key_field: key, 'fingerprint': fingerprint},
+            {'$setOnInsert': doc},
+            upsert=True
+        )
+    return list(requests.values())
+
+
+def write_results(collection_name, items, key_field, fingerprint):
+    """
+    Upserts a batch of search results in one round-trip. Returns the number inserted.
+    """
+    requests = build_upserts(items, key_field, fingerprint)
+    if not requests:
+        return 0
+    result = mongo.get_db()[collection_name].bulk_write(requests, ordered=False)
+    return result.upserted_count
+
+
+def _write_logged(collection_name, items, key_field, fingerprint):
+    try:
+        write_results(collection_name, items, key_field, fingerprint)
+    except PyMongoError as e:
+        print(f"[DEBUG] Failed to cache results in {collection_name}: {e}")
+
+
+def schedule_results(collection_name, items, key_field, fingerprint):
+    """
+    Caches results off the request path when SEARCH_CACHE_WRITE_BACKGROUND is set,
+    otherwise writes them inline. Failures are logged, never raised to the caller.
+    """
+    # Copy now: the caller may serialize or mutate the items after returning
+    items = [dict(item) for item in items]
+    if settings.SEARCH_CACHE_WRITE_BACKGROUND:
+        _get_executor().submit(_write_logged, collection_name, items, key_field, fingerprint)
+    else:
+        _write_logged(collection_name, items, key_field, fingerprint)
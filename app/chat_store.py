@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime
+
+from django.conf import settings
+from pymongo import DESCENDING, ReturnDocument
+
+from . import mongo
+
+# Chat history layout:
+#   chat_history  one small header per user: user_id, message_count, created_at, updated_at
+#   chat_buckets  fixed-size pages of messages: user_id, bucket, count, messages[{seq, role, message}]
+# Message `seq` n lives in bucket n // CHAT_BUCKET_SIZE, so reading the last N
+# messages touches at most N // size + 2 small documents however long the
+# history is. Old headers that still carry a `conversation` array are migrated
+# into buckets on first use (or in bulk with `manage.py migrate_chat_buckets`).
+
+def bucket_size():
+    return settings.CHAT_BUCKET_SIZE
+
+
+def migrate_legacy_conversation(db, user_id):
+    """
+    Moves a legacy `conversation` array into bucket documents. Idempotent; returns
+    the number of messages migrated (0 when there was nothing to do).
+    """
+    doc = db.chat_history.find_one({'user_id': user_id, 'conversation': {'$exists': True}})
+    if not doc:
+        return 0
+    conversation = doc['conversation']
+    size = bucket_size()
+    now = datetime.utcnow()
+    for start in range(0, len(conversation), size):
+        messages = [dict(msg, seq=start + i) for i, msg in enumerate(conversation[start:start + size])]
+        db.chat_buckets.replace_one(
+            {'user_id': user_id, 'bucket': start // size},
+            {
+                'user_id': user_id,
+                'bucket': start // size,
+                'count': len(messages),
+                'messages': messages,
+                'created_at': doc.get('created_at', now),
+                'updated_at': now,
+            },
+            upsert=True
+        )
+    db.chat_history.update_one(
+        {'_id': doc['_id'], 'conversation': {'$exists': True}},
+        {'$set': {'message_count': len(conversation)}, '$unset': {'conversation': ''}}
+    )
+    return len(conversation)
+
+
+async def ensure_migrated(user_id):
+    await asyncio.to_thread(migrate_legacy_conversation, mongo.get_db(), user_id)
+
+
+async def append_message(db, user_id, message):
+    """
+    Appends one (already encrypted) message and returns its sequence number.
+    """
+    now = datetime.utcnow()
+    header = await db.chat_history.find_one_and_update(
+        {'user_id': user_id},
+        {
+            '$inc': {'message_count': 1},
+            '$set': {'updated_at': now},
+            '$setOnInsert': {'created_at': now}
+        },
+        upsert=True,
+        projection={'message_count': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    seq = header['message_count'] - 1
+    await db.chat_buckets.update_one(
+        {'user_id': user_id, 'bucket': seq // bucket_size()},
+        {
+            '$push': {'messages': dict(message, seq=seq)},
+            '$inc': {'count': 1},
+            '$set': {'updated_at': now},
+            '$setOnInsert': {'created_at': now}
+        },
+        upsert=True
+    )
+    return seq
+
+
+async def recent_messages(db, user_id, limit):
+    """
+    Returns the last `limit` (encrypted) messages in order, reading only the newest buckets.
+    """
+    cursor = db.chat_buckets.find(
+        {'user_id': user_id}, {'messages': 1}
+    ).sort('bucket', DESCENDING).limit(limit // bucket_size() + 2)
+    messages = []
+    async for doc in cursor:
+        messages.extend(doc['messages'])
+    messages.sort(key=lambda msg: msg['seq'])
+    return messages[-limit:]
+
+
+async def messages_since(db, user_id, start):
+    """
+    Returns the (encrypted) messages from seq `start` on, in order, reading only their buckets.
+    """
+    cursor = db.chat_buckets.find({'user_id': user_id, 'bucket': {'$gte': start // bucket_size()}}, {'messages': 1})
+    messages = []
+    async for doc in cursor:
+        messages.extend(msg for msg in doc['messages'] if msg['seq'] >= start)
+    messages.sort(key=lambda msg: msg['seq'])
+    return messages
+
+
+def messages_by_seq(db, user_id, seqs):
+    """
+    Returns {seq: (encrypted) message} for the given sequence numbers, reading only their buckets.
+    """
+    seqs = set(seqs)
+    buckets = {seq // bucket_size() for seq in seqs}
+    found = {}
+    for doc in db.chat_buckets.find({'user_id': user_id, 'bucket': {'$in': list(buckets)}}, {'messages': 1}):
+        for msg in doc['messages']:
+            if msg['seq'] in seqs:
+                found[msg['seq']] = msg
+    return found
+
+
+def first_message(db, user_id):
+    """
+    Returns the first (encrypted) message of a user's history, for listings.
+    """
+    doc = db.chat_buckets.find_one({'user_id': user_id, 'bucket': 0}, {'messages': {'$slice': 1}})
+    if doc and doc['messages']:
+        return doc['messages'][0]
+    legacy = db.chat_history.find_one({'user_id': user_id}, {'conversation': {'$slice': 1}})
+    if legacy and legacy.get('conversation'):
+        return legacy['conversation'][0]
+    return None
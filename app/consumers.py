@@ -1,30 +1,31 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime
 import os
-import requests
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from asgiref.sync import sync_to_async
-import httpx
-from users.crypt import encrypt_with_fingerprint, decrypt_with_fingerprint
+from users.crypt import encrypt_with_fingerprint, decrypt_with_fingerprint, decrypt_many, seal_with_fingerprint
+from . import chat_store, llm, mongo, prompts, search_index
+from .intent import classify, may_be_tool_call, parse_tool_call
+from .prompt_budget import (
+    CHARS_PER_TOKEN, compact_profile, fit_history, format_message, truncate_to_tokens
+)
 import asyncio
 User = get_user_model()
 
 
 
-
-# MongoDB setup
-mongo = AsyncIOMotorClient(settings.MONGO_URI)
-db = mongo.veteran_docs
-
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         try:
             self.user_id = int(self.scope['url_route']['kwargs']['user_id'])
             self.user = await sync_to_async(User.objects.get)(id=self.user_id)
             self.fingerprint = self.user.fingerprint
+            self.turn_count = 0
+            self._summary_task = None
+            self.db = mongo.get_async_db()
+            await chat_store.ensure_migrated(self.fingerprint)
             await self.accept()
         except User.DoesNotExist:
             await self.close()
@@ -35,50 +36,100 @@ class ChatConsumer(AsyncWebsocketConsumer):
     async def receive(self, text_data):
         data = json.loads(text_data)
         user_question = data.get("message")
+        stream = data.get("stream", settings.CHAT_STREAM_DEFAULT)
 
-        # Store user message
-        await db.chat_history.update_one(
-            {'user_id': self.fingerprint},
-            {
-                '$push': {'conversation': encrypt_with_fingerprint({'role': 'user', 'message': user_question}, self.fingerprint)},
-                '$set': {'updated_at': datetime.utcnow()},
-                '$setOnInsert': {'created_at': datetime.utcnow()}
-            },
-            upsert=True
-        )
+        # Persist the user message in the background while context is gathered
+        store_question = asyncio.create_task(self.store_message('user', user_question))
 
-        chat_history = await self.get_chat_history(self.fingerprint)
-        profile_data = await self.get_user_profile(self.fingerprint)
+        # Only search the web when the local router thinks fresh results will help
+        intent = classify(user_question, chat_history=self.turn_count > 0)
+        self.turn_count += 1
+        web_search = self.perform_web_search(user_question) if intent.needs_search else asyncio.sleep(0, result=[])
 
-        # Always perform web search first (internal, not via API)
-        mcp_results = await self.perform_web_search(user_question)
+        timeouts = settings.CHAT_CONTEXT_TIMEOUTS
+        chat_history, summary_state, profile_data, mcp_results = await asyncio.gather(
+            self.gather_context('history', self.get_chat_history(self.fingerprint), timeouts['history'], []),
+            self.gather_context('summary', self.get_conversation_summary(self.fingerprint), timeouts['history'], {}),
+            self.gather_context('profile', self.get_user_profile(self.fingerprint), timeouts['profile'], None),
+            self.gather_context('web_search', web_search, timeouts['web_search'], []),
+        )
+        # Turns that left the window but are not summarized yet (e.g. after failed
+        # updates) are loaded too, so the summary never skips any
+        summarized_through = summary_state.get('summarized_through')
+        if chat_history and summarized_through is not None and summarized_through < chat_history[0]['index']:
+            unsummarized = self.get_chat_history(self.fingerprint, since=summarized_through)
+            chat_history = await self.gather_context('history', unsummarized, timeouts['history'], chat_history)
+        # The history read races the write above; drop the current question if it made it in
+        if chat_history and (chat_history[-1]['role'], chat_history[-1]['message']) == ('user', user_question):
+            chat_history = chat_history[:-1]
         print(f"[DEBUG] MCP results: {mcp_results}")  # Debug: log MCP results
 
-        # Build prompt with web results always included
+        budget = settings.CHAT_PROMPT_BUDGET
+        chat_window, overflow = fit_history(
+            chat_history, budget['history'], settings.CHAT_HISTORY_WINDOW, budget['message']
+        )
+        summary = summary_state.get('summary')
         prompt = self.build_prompt(
-            profile_data, chat_history, user_question,
-            knowledge_base=json.dumps(mcp_results, indent=2)
+            profile_data, chat_window, user_question,
+            knowledge_base=json.dumps(mcp_results, indent=2) if mcp_results else None,
+            summary=summary
         )
-        reply = await self.ask_llama_async(prompt)
+        reply = await self.generate_reply(prompt, stream)
+
+        # Honor the TOOL_CALL protocol from build_prompt: search, then answer with the results
+        tool_query = parse_tool_call(reply)
+        if tool_query:
+            mcp_results = await self.gather_context(
+                'web_search', self.perform_web_search(tool_query), timeouts['web_search'], []
+            )
+            prompt = self.build_prompt(
+                profile_data, chat_window, user_question,
+                knowledge_base=json.dumps(mcp_results, indent=2),
+                summary=summary
+            )
+            reply = await self.generate_reply(prompt, stream)
         print(f"[DEBUG] Llama reply: {reply}")  # Debug: log Llama's response
 
         # Validate links in actions (if any)
         cleaned_reply = await self.clean_actions_links(reply)
+        if stream:
+            await self.send(json.dumps({"response": cleaned_reply, "done": True}))
+        else:
+            await self.send(json.dumps({"response": cleaned_reply}))
 
-        # Store bot reply
-        await db.chat_history.update_one(
-            {'user_id': self.fingerprint},
-            {
-                '$push': {'conversation': encrypt_with_fingerprint({'role': 'bot', 'message': cleaned_reply}, self.fingerprint)},
-                '$set': {'updated_at': datetime.utcnow()}
-            },
-            upsert=True
-        )
+        # Store bot reply after the user message so the conversation stays ordered
+        await store_question
+        await self.store_message('bot', cleaned_reply)
+
+        # Fold turns that no longer fit the prompt into the rolling summary
+        self.refresh_summary(summary_state, overflow)
+
+    async def gather_context(self, name, coro, timeout, default):
+        """
+        Awaits one context source, falling back to `default` on timeout or error.
+        """
+        try:
+            return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"[DEBUG] Context source '{name}' timed out after {timeout}s")
+        except Exception as e:
+            print(f"[DEBUG] Context source '{name}' failed: {e}")
+        return default
 
-        await self.send(json.dumps({"response": cleaned_reply}))
+    def encrypt_message(self, role, message):
+        if settings.SEALED_DOCUMENTS:
+            return seal_with_fingerprint({'role': role, 'message': message}, self.fingerprint, plaintext_keys=())
+        return encrypt_with_fingerprint({'role': role, 'message': message}, self.fingerprint)
+
+    async def store_message(self, role, message):
+        try:
+            seq = await chat_store.append_message(self.db, self.fingerprint, self.encrypt_message(role, message))
+            await search_index.aindex_text(self.db, self.fingerprint, 'chat', seq, message)
+        except Exception as e:
+            print(f"[DEBUG] Failed to store {role} message: {e}")
 
     async def get_user_profile(self, fingerprint):
-        doc = await db["user_data"].find_one({'fingerprint': fingerprint})
+        doc = await self.db["user_data"].find_one({'fingerprint': fingerprint})
         if doc:
             try:
                 decrypted_doc = decrypt_with_fingerprint(doc, fingerprint)
@@ -89,97 +140,132 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 return {"error": f"Decryption failed: {str(e)}"}
         return None
 
-    async def get_chat_history(self, user_id, limit=20):
-        doc = await db.chat_history.find_one({'user_id': user_id})
-        if doc and 'conversation' in doc:
-            encrypted_conversation = doc['conversation'][-limit:]
-            decrypted_conversation = [
-                decrypt_with_fingerprint(item, self.fingerprint) for item in encrypted_conversation
-            ]
-            return decrypted_conversation
-        return []
+    async def get_chat_history(self, user_id, limit=None, since=None):
+        """
+        Returns the latest `limit` messages (the prompt window by default), or
+        with `since` every message from that index on, each tagged with its
+        absolute `index` in the conversation.
+        """
+        if since is not None:
+            encrypted_conversation = await chat_store.messages_since(self.db, user_id, since)
+        else:
+            encrypted_conversation = await chat_store.recent_messages(
+                self.db, user_id, limit or settings.CHAT_HISTORY_WINDOW
+            )
+        decrypted_conversation = decrypt_many(encrypted_conversation, self.fingerprint)
+        for msg in decrypted_conversation:
+            msg['index'] = msg.pop('seq')
+        return decrypted_conversation
+
+    async def get_conversation_summary(self, fingerprint):
+        doc = await self.db.chat_summaries.find_one({'user_id': fingerprint})
+        if not doc:
+            return {'summary': None, 'summarized_through': 0}
+        return {
+            'summary': decrypt_with_fingerprint({'summary': doc['summary']}, fingerprint)['summary'],
+            'summarized_through': doc.get('summarized_through', 0),
+        }
 
-    def build_prompt(self, user_profile, chat_history, user_question, knowledge_base=None):
-        prompt = (
-            "You are a helpful assistant for U.S. military veterans. "
-            "You have access to the user's profile (below) and the conversation history. "
-            "If you need information not in the user's profile or chat history, you can use a web search tool. "
-            "If you use the tool, you will be provided with search results to help answer the user's question. "
-            "Always return your answer in the following JSON format, where \"message\" is your reply (can be a paragraph, steps, or bullet points), "
-            "and \"actions\" is an array of interactive elements (links, phone numbers, comments) only when available:\n\n"
-            "[\n"
-            "  {\n"
-            "    \"message\": \"Your main reply to the user.\",\n"
-            "    \"actions\": [\n"
-            "      { \"action\": \"link\", \"do\": \"https://example.com\", \"help_text\": \"Description of the link\" },\n"
-            "      { \"action\": \"phone\", \"do\": \"+1-800-123-4567\", \"help_text\": \"Description of the phone number\" },\n"
-            "      { \"action\": \"comment\", \"do\": \"Any extra comment or fact.\", \"help_text\": \"Description of the comment\" }\n"
-            "    ]\n"
-            "  }\n"
-            "]\n\n"
-            "Make sure your output is valid JSON using double quotes (\"), not single quotes.\n"
-            "If you need to use the tool, respond with: TOOL_CALL: <query>. Otherwise, answer directly.\n\n"
-            f"User Profile (JSON):\n{json.dumps(user_profile, indent=2)}\n\n"
-            f"Conversation History (most recent last):\n"
+    def refresh_summary(self, summary_state, overflow):
+        """
+        Schedules a summary update for the oldest unsummarized turns that have
+        dropped out of the prompt window, at most CHAT_SUMMARY_BATCH of them.
+        Runs after the reply is sent. One update at a time: turns not folded in
+        yet are loaded again next turn, since summarized_through has not moved.
+        """
+        if self._summary_task is not None and not self._summary_task.done():
+            return
+        summarized_through = summary_state.get('summarized_through')
+        if summarized_through is None:
+            # The summary read failed; which turns are summarized is unknown
+            return
+        pending = [msg for msg in overflow if msg.get('index', -1) >= summarized_through]
+        pending = pending[:settings.CHAT_SUMMARY_BATCH]
+        if not pending:
+            return
+        # Keep a reference: the event loop only holds tasks weakly
+        self._summary_task = asyncio.create_task(self.update_summary(pending))
+
+    async def update_summary(self, pending):
+        # Re-read the stored state: the turn's copy may predate an update that just finished
+        state = await self.get_conversation_summary(self.fingerprint)
+        previous_summary = state['summary']
+        pending = [msg for msg in pending if msg['index'] >= state['summarized_through']]
+        if not pending:
+            return
+        budget = settings.CHAT_PROMPT_BUDGET['summary']
+        messages = prompts.CHAT_SUMMARY.messages(
+            max_words=budget * CHARS_PER_TOKEN // 6,
+            summary=previous_summary or '(none)',
+            turns="".join(format_message(msg) for msg in pending),
+        )
+        try:
+            summary = await llm.achat_completion(messages, task='summary', cache=False)
+        except Exception as e:
+            print(f"[DEBUG] Summary refresh failed: {e}")
+            return
+        summary = truncate_to_tokens(summary.strip(), budget)
+        await self.db.chat_summaries.update_one(
+            {'user_id': self.fingerprint},
+            {'$set': {
+                'summary': encrypt_with_fingerprint({'summary': summary}, self.fingerprint)['summary'],
+                'summarized_through': pending[-1]['index'] + 1,
+                'updated_at': datetime.utcnow(),
+            }},
+            upsert=True
         )
 
+    def build_prompt(self, user_profile, chat_history, user_question, knowledge_base=None, summary=None):
+        budget = settings.CHAT_PROMPT_BUDGET
+        # Dynamic part only; the static instructions live in the prompts.CHAT system prefix
+        prompt = f"User Profile (JSON):\n{compact_profile(user_profile, budget['profile'])}\n\n"
+        if summary:
+            prompt += f"Summary of Earlier Conversation:\n{truncate_to_tokens(summary, budget['summary'])}\n\n"
+        prompt += "Conversation History (most recent last):\n"
+
         for msg in chat_history:
-            prompt += f"{msg['role'].capitalize()}: {msg['message']}\n"
-        prompt += f"\nUser's Current Question: {user_question}\n"
+            prompt += format_message(msg)
+        prompt += f"\nUser's Current Question: {truncate_to_tokens(user_question, budget['question'])}\n"
         if knowledge_base:
-            prompt += f"\nKnowledge Base:\n{knowledge_base}\n"
-        prompt += "\nAnswer as helpfully and concisely as possible."
-        # Add behavioral instructions for allowed topics, web search, and mental health
-        prompt += (
-            "\n\nIMPORTANT INSTRUCTIONS:\n"
-            "- Only respond to questions related to: resume reviews, career path suggestions, benefits information, education opportunities, business (if veteran-related), connection building (if veteran-related), veteran mental health and wellness, and housing transition.\n"
-            "- If the user's question is not related to these areas, politely decline to answer and state that you are focused on supporting veterans in these areas.\n"
-            "- If the user's question is about housing, housing transition, rental assistance, home buying, or veteran housing programs, you MUST answer and provide resources or guidance.\n"
-            "- Use the web search tool (TOOL_CALL) only for career, education, education gap, education transfer, housing transition, and similar veteran-related queries. Do NOT use web search for unrelated topics.\n"
-            "- For mental health topics, act as a mentor: listen empathetically, provide supportive and encouraging responses, promote wellness and peer support, and encourage seeking professional help if needed (but do not give medical advice).\n"
-            "- Always use the user's profile and chat history for context.\n"
-            "- Focus on service navigation (healthcare, education, employment, housing, housing transition), transition support (resume, job training, mentorship), and mental health/wellness (stress management, counseling, peer support).\n"
-            "\nExample allowed questions for housing topics:\n"
-            "- 'Can you help me find veteran housing?'\n"
-            "- 'What are my options for housing transition?'\n"
-            "- 'How do I get rental assistance as a veteran?'\n"
-        )
+            prompt += f"\nKnowledge Base:\n{truncate_to_tokens(knowledge_base, budget['knowledge_base'])}\n"
         return prompt
 
     async def ask_llama(self, prompt):
-        headers = {'Authorization': f'Bearer {settings.GROQ_API_KEY}'}
-        data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant for U.S. military veterans."},
-                {"role": "user", "content": prompt}
-            ]
-        }
+        return await self.ask_llama_async(prompt)
+
+    async def ask_llama_async(self, prompt):
+        messages = prompts.CHAT.messages(content=prompt)
         try:
-            response = requests.post(settings.GROQ_API_URL, json=data, headers=headers)
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+            return await llm.achat_completion(messages, task='chat')
         except Exception as e:
             return f"[Error contacting Llama 4: {str(e)}]"
 
-    async def ask_llama_async(self, prompt):
-        headers = {'Authorization': f'Bearer {settings.GROQ_API_KEY}'}
-        data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant for U.S. military veterans."},
-                {"role": "user", "content": prompt}
-            ]
-        }
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(settings.GROQ_API_URL, json=data, timeout=60, headers=headers)
-                response.raise_for_status()
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
-            except Exception as e:
+    async def generate_reply(self, prompt, stream):
+        if stream:
+            # Tokens go out as {"delta": ...} frames; the final {"response": ..., "done": true}
+            # frame carries the link-checked reply once generation has finished.
+            return await self.stream_llama(prompt)
+        return await self.ask_llama_async(prompt)
+
+    async def stream_llama(self, prompt):
+        messages = prompts.CHAT.messages(content=prompt)
+        reply = ""
+        sent = 0
+        try:
+            async for delta in llm.astream_chat_completion(messages, task='chat'):
+                reply += delta
+                # Hold tokens back until we know the reply is not a TOOL_CALL
+                if sent == 0 and may_be_tool_call(reply):
+                    continue
+                await self.send(json.dumps({"delta": reply[sent:]}))
+                sent = len(reply)
+        except Exception as e:
+            if not reply:
                 return f"[Error contacting Llama 4: {str(e)}]"
+            print(f"[DEBUG] Llama stream interrupted: {e}")
+        if sent == 0 and reply.strip() and not parse_tool_call(reply):
+            await self.send(json.dumps({"delta": reply}))
+        return reply
 
     async def clean_actions_links(self, reply):
         import httpx
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from types import MappingProxyType
+
+from django.conf import settings
+
+from .mos_match import MIN_PREFIX, generic_afsc, normalize_code
+
+# Local MOS -> civilian keyword crosswalk, so job and mentor searches do not
+# need an LLM call to pick search keywords. The hand-edited source
+# (MOS_CROSSWALK_SOURCE_PATH) maps MOS codes, pay grade bands and
+# award/training terms to civilian titles and skills. `manage.py
+# build_crosswalk` compiles it into a flat weighted index
+# (MOS_CROSSWALK_INDEX_PATH) that is loaded once per process. If the
+# compiled index is missing or stale it is compiled in memory instead.
+
+TITLE_WEIGHT = 1.0
+SKILL_WEIGHT = 0.7
+RANK_DECAY = 0.05
+# How much each profile section contributes to a keyword's score
+SECTION_WEIGHTS = {
+    'mos': 1.0,
+    'earlier_mos': 0.8,
+    'civilian_jobs': 1.0,
+    'skills': 0.6,
+    'pay_grade': 0.5,
+    'terms': 0.4,
+}
+
+_GRADE_RE = re.compile(r'^([EWO])-?0*(\d{1,2})$')
+_WORD_RE = re.compile(r'[a-z0-9+#]+')
+
+_index = None
+_lock = threading.Lock()
+
+
+def normalize_grade(grade):
+    match = _GRADE_RE.match(re.sub(r'\s+', '', str(grade or '').upper()))
+    return f"{match.group(1)}{int(match.group(2))}" if match else None
+
+
+def normalize_text(text):
+    return ' '.join(_WORD_RE.findall(str(text or '').lower()))
+
+
+def _ranked(keywords, weight):
+    return [[keyword, round(max(weight - i * RANK_DECAY, 0.1), 3)] for i, keyword in enumerate(keywords)]
+
+
+def _expand_grades(spec):
+    start, _, end = spec.partition('-')
+    start, end = normalize_grade(start), normalize_grade(end or start)
+    if not start or not end or start[0] != end[0]:
+        raise ValueError(f"Invalid pay grade range '{spec}'")
+    return [f"{start[0]}{n}" for n in range(int(start[1:]), int(end[1:]) + 1)]
+
+
+def _source_digest(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+
+def compile_source(raw):
+    """
+    Compiles the crosswalk source (bytes of JSON) into the flat weighted index.
+    """
+    source = json.loads(raw)
+    codes = {}
+    for code, entry in source['mos'].items():
+        codes[normalize_code(code)] = (
+            _ranked(entry.get('titles', []), TITLE_WEIGHT) + _ranked(entry.get('skills', []), SKILL_WEIGHT)
+        )
+    grades = {}
+    for band in source.get('pay_grades', []):
+        for grade in _expand_grades(band['grades']):
+            grades[grade] = _ranked(band['keywords'], TITLE_WEIGHT)
+    terms = {normalize_text(term): _ranked(keywords, TITLE_WEIGHT) for term, keywords in source.get('terms', {}).items()}
+    return {
+        'version': source.get('version', 1),
+        'source_sha256': _source_digest(raw),
+        'codes': codes,
+        'grades': grades,
+        'terms': terms,
+        'max_term_words': max((len(term.split()) for term in terms), default=1),
+    }
+
+
+def build_index_file():
+    """
+    Compiles the source and writes the index file. Returns the compiled index.
+    """
+    with open(settings.MOS_CROSSWALK_SOURCE_PATH, 'rb') as f:
+        compiled = compile_source(f.read())
+    with open(settings.MOS_CROSSWALK_INDEX_PATH, 'w') as f:
+        json.dump(compiled, f, separators=(',', ':'), sort_keys=True)
+    return compiled
+
+
+class Crosswalk:
+    """
+    Read-only compiled crosswalk: keyword tuples by code, grade and term.
+    """
+    __slots__ = ('version', 'codes', 'grades', 'terms', 'max_term_words')
+
+    def __init__(self, compiled):
+        def freeze(table):
+            return MappingProxyType({key: tuple(map(tuple, pairs)) for key, pairs in table.items()})
+
+        self.version = compiled['version']
+        self.codes = freeze(compiled['codes'])
+        self.grades = freeze(compiled['grades'])
+        self.terms = freeze(compiled['terms'])
+        self.max_term_words = compiled['max_term_words']
+
+    def code_keywords(self, code):
+        """
+        Keywords for an MOS/AFSC/rating, trying the generic AFSC skill level
+        ('3D032' -> '3D0X2') and shorter prefixes ('11B10' -> '11B', 'HM2' -> 'HM').
+        """
+        code = normalize_code(code)
+        generic = generic_afsc(code)
+        candidates = [code, generic] if generic else [code]
+        candidates += [code[:end] for end in range(len(code) - 1, MIN_PREFIX - 1, -1)]
+        for candidate in candidates:
+            if candidate in self.codes:
+                return self.codes[candidate]
+        return ()
+
+    def term_keywords(self, text):
+        words = normalize_text(text).split()
+        found = []
+        for size in range(min(self.max_term_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                found.extend(self.terms.get(' '.join(words[start:start + size]), ()))
+        return found
+
+
+def _load():
+    with open(settings.MOS_CROSSWALK_SOURCE_PATH, 'rb') as f:
+        raw = f.read()
+    path = settings.MOS_CROSSWALK_INDEX_PATH
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            compiled = json.load(f)
+        if compiled.get('source_sha256') == _source_digest(raw):
+            return Crosswalk(compiled)
+        print("[crosswalk] Index is stale; run `manage.py build_crosswalk`. Compiling in memory.")
+    return Crosswalk(compile_source(raw))
+
+
+def get_crosswalk() -> Crosswalk:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = _load()
+    return _index
+
+
+def _mos_recency(mos):
+    return mos.get('end_date') or mos.get('start_date') or ''
+
+
+def profile_keywords(profile, limit=None):
+    """
+    Ranked civilian keywords for a decrypted user_data profile, best first.
+    Scores add up across sources, so a keyword backed by both the MOS and a
+    course outranks one backed by either alone.
+    """
+    crosswalk = get_crosswalk()
+    scores = {}
+    labels = {}
+
+    def add(pairs, section_weight):
+        for keyword, weight in pairs:
+            key = keyword.lower()
+            labels.setdefault(key, keyword)
+            scores[key] = scores.get(key, 0.0) + weight * section_weight
+
+    def items(section):
+        return [item for item in profile.get(section) or [] if isinstance(item, dict)]
+
+    history = sorted(items('mos_history'), key=_mos_recency, reverse=True)
+    for i, mos in enumerate(history):
+        if mos.get('code'):
+            add(crosswalk.code_keywords(mos['code']), SECTION_WEIGHTS['mos' if i == 0 else 'earlier_mos'])
+
+    add(_ranked([job['title'] for job in items('civilian_equivalent_jobs') if job.get('title')],
+                TITLE_WEIGHT), SECTION_WEIGHTS['civilian_jobs'])
+    add(_ranked([skill['name'] for skill in items('skills') if skill.get('name')],
+                SKILL_WEIGHT), SECTION_WEIGHTS['skills'])
+
+    grade = normalize_grade(profile.get('pay_grade'))
+    if grade:
+        add(crosswalk.grades.get(grade, ()), SECTION_WEIGHTS['pay_grade'])
+
+    for section in ('awards', 'training_courses', 'certifications'):
+        for item in items(section):
+            add(crosswalk.term_keywords(item.get('name')), SECTION_WEIGHTS['terms'])
+
+    ranked = sorted(scores, key=lambda key: (-scores[key], key))
+    limit = limit or settings.MOS_CROSSWALK_MAX_KEYWORDS
+    return [labels[key] for key in ranked[:limit]]
@@ -0,0 +1,240 @@
+import math
+import re
+from collections import Counter, defaultdict, namedtuple
+
+# Result of routing one chat message. `label` is the topic or rule that fired,
+# `needs_search` tells ChatConsumer whether to hit SerpAPI before the LLM call.
+Intent = namedtuple('Intent', ['label', 'needs_search', 'confidence', 'reason'])
+
+# Topics the assistant is allowed to cover (see ChatConsumer.build_prompt) and
+# which of them benefit from fresh web results.
+SEARCH_TOPICS = {'career', 'education', 'housing', 'benefits', 'business', 'networking'}
+
+GREETING_RE = re.compile(
+    r"^\s*(hi|hello|hey|yo|howdy|good (morning|afternoon|evening|night)|thanks|thank you|thx|"
+    r"bye|goodbye|see you|ok(ay)?|cool|great|got it|sounds good)[\s!.,?]*(there|again|so much|a lot)?[\s!.,?]*$",
+    re.IGNORECASE,
+)
+# Crisis and clinical phrases always take the mental-health route. Everyday
+# mood words ("stressed", "struggling") only do when the message is not about a
+# job, school or benefit, e.g. "I'm struggling to find a job after the Army".
+CRISIS_RE = re.compile(
+    r"\b(suicid\w*|self[- ]harm|kill(ing)? myself|end(ing)? (it all|my life)|hopeless|ptsd|"
+    r"depress(ed|ion)|panic attacks?|can'?t sleep|insomnia|nightmares?|mental health)\b",
+    re.IGNORECASE,
+)
+MENTAL_HEALTH_RE = re.compile(
+    r"\b(stress(ed|ful)?|anxi(ous|ety)|lonely|loneliness|sad|overwhelmed|burn(ed|t)? ?out|"
+    r"struggling|feel(ing)? (down|lost|alone|empty))\b",
+    re.IGNORECASE,
+)
+PRACTICAL_TOPIC_RE = re.compile(
+    r"\b(jobs?|careers?|resumes?|cv|interviews?|hir(e|ed|ing)|employ(er|ers|ment)|salary|work|"
+    r"gi bill|school|college|degree|class(es)?|loans?|claims?|benefits|business|rent|housing|mos)\b",
+    re.IGNORECASE,
+)
+FOLLOWUP_RE = re.compile(
+    r"^\s*(and|also|what about|how about|tell me more|more (details|info)|why|how so|explain|"
+    r"can you (explain|elaborate)|elaborate|what do you mean|which one|the (first|second|last) one|"
+    r"yes|no|sure|please|go on|continue)\b",
+    re.IGNORECASE,
+)
+FRESH_INFO_RE = re.compile(
+    r"\b(latest|current(ly)?|today|this (week|month|year)|20\d\d|deadline|near me|in my area|"
+    r"where can i|find me|look up|search|hiring|openings?|apply|application|website|link|phone number)\b",
+    re.IGNORECASE,
+)
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+# Seed phrases for the lexical model, one list per label.
+TRAINING_DATA = {
+    'resume': [
+        "can you review my resume",
+        "help me write a resume",
+        "how do i translate my military experience on my resume",
+        "improve my cv summary",
+        "what should my resume headline be",
+        "rewrite my bullet points for a civilian employer",
+        "how long should my resume be",
+        "cover letter for my first civilian job",
+    ],
+    'career': [
+        "what jobs fit my mos",
+        "career path suggestions after the army",
+        "which civilian careers match my skills",
+        "how do i get a job in cybersecurity",
+        "companies that hire veterans",
+        "job openings for logistics specialists",
+        "how do i prepare for a job interview",
+        "salary for project manager roles",
+        "should i become a police officer or firefighter",
+        "skillbridge internship programs",
+    ],
+    'education': [
+        "how do i use my gi bill",
+        "post 9/11 gi bill for college",
+        "can i transfer my gi bill to my kids",
+        "education benefits for a masters degree",
+        "colleges that accept military credits",
+        "vocational training programs for veterans",
+        "how do i fill an education gap",
+        "yellow ribbon schools",
+        "certification courses paid by the va",
+    ],
+    'housing': [
+        "can you help me find veteran housing",
+        "what are my options for housing transition",
+        "how do i get rental assistance as a veteran",
+        "va home loan eligibility",
+        "buying a house with a va loan",
+        "homeless veteran programs",
+        "moving off base where do i live",
+        "help paying rent",
+    ],
+    'benefits': [
+        "how do i file a va disability claim",
+        "what benefits am i eligible for",
+        "va healthcare enrollment",
+        "disability rating increase",
+        "how do i get my dd214",
+        "tricare coverage after separation",
+        "pension and compensation",
+        "appeal a va decision",
+    ],
+    'business': [
+        "how do i start a small business as a veteran",
+        "veteran owned business certification",
+        "sba loans for veterans",
+        "franchise opportunities for veterans",
+        "write a business plan",
+        "government contracting for veteran businesses",
+    ],
+    'networking': [
+        "how do i connect with other veterans",
+        "find a mentor in my field",
+        "veteran networking events",
+        "join a veteran service organization",
+        "linkedin groups for veterans",
+        "meet veterans in my city",
+    ],
+    'mental_health': [
+        "i have been feeling really stressed",
+        "how do i cope with ptsd",
+        "i feel lonely since getting out",
+        "i can not sleep at night",
+        "talking to a counselor",
+        "peer support groups",
+        "i feel lost after leaving the service",
+        "how do i manage anxiety",
+    ],
+    'off_topic': [
+        "what is the weather tomorrow",
+        "who won the game last night",
+        "give me a recipe for lasagna",
+        "recommend a good movie",
+        "write me a poem about cats",
+        "what is the capital of france",
+        "help me with my python code",
+        "tell me a joke",
+        "who will win the election",
+        "what is the best video game",
+    ],
+}
+
+
+class LexicalClassifier:
+    """
+    Multinomial naive Bayes over unigrams and bigrams with Laplace smoothing.
+    Small enough to train at import and classify in microseconds.
+    """
+
+    def __init__(self, training_data):
+        self.labels = list(training_data)
+        self.word_counts = defaultdict(Counter)
+        self.totals = Counter()
+        self.vocabulary = set()
+        doc_counts = Counter()
+        for label, phrases in training_data.items():
+            for phrase in phrases:
+                features = self.features(phrase)
+                self.word_counts[label].update(features)
+                self.totals[label] += len(features)
+                self.vocabulary.update(features)
+                doc_counts[label] += 1
+        n_docs = sum(doc_counts.values())
+        self.priors = {label: math.log(doc_counts[label] / n_docs) for label in self.labels}
+
+    @staticmethod
+    def features(text):
+        tokens = TOKEN_RE.findall(text.lower())
+        return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+    def predict(self, text):
+        """
+        Returns (label, probability) for the most likely label.
+        """
+        features = [f for f in self.features(text) if f in self.vocabulary]
+        if not features:
+            return None, 0.0
+        size = len(self.vocabulary)
+        scores = {}
+        for label in self.labels:
+            denominator = self.totals[label] + size
+            counts = self.word_counts[label]
+            scores[label] = self.priors[label] + sum(
+                math.log((counts[f] + 1) / denominator) for f in features
+            )
+        best = max(scores, key=scores.get)
+        peak = scores[best]
+        normalizer = sum(math.exp(score - peak) for score in scores.values())
+        return best, 1.0 / normalizer
+
+
+classifier = LexicalClassifier(TRAINING_DATA)
+
+
+def classify(message, chat_history=None, threshold=0.5):
+    """
+    Routes a chat message before the LLM call. Rules run first; the lexical model
+    decides the rest. When nothing is confident the message is searched, which
+    matches the old always-search behaviour.
+    """
+    text = (message or '').strip()
+    if not text or GREETING_RE.match(text):
+        return Intent('greeting', False, 1.0, 'rule')
+    if CRISIS_RE.search(text) or (MENTAL_HEALTH_RE.search(text) and not PRACTICAL_TOPIC_RE.search(text)):
+        return Intent('mental_health', False, 1.0, 'rule')
+    if chat_history and len(text.split()) <= 8 and FOLLOWUP_RE.match(text):
+        return Intent('followup', False, 1.0, 'rule')
+
+    label, confidence = classifier.predict(text)
+    if label is None or confidence < threshold:
+        return Intent(label or 'unknown', True, confidence, 'fallback')
+    if label == 'off_topic':
+        return Intent(label, False, confidence, 'model')
+    needs_search = label in SEARCH_TOPICS or bool(FRESH_INFO_RE.search(text))
+    return Intent(label, needs_search, confidence, 'model')
+
+
+TOOL_CALL_PREFIX = 'TOOL_CALL:'
+TOOL_CALL_RE = re.compile(r"^\s*TOOL_CALL:\s*(.+)", re.IGNORECASE | re.DOTALL)
+
+
+def may_be_tool_call(partial_reply):
+    """
+    True while a streamed reply could still turn out to be a TOOL_CALL, so the
+    consumer can hold tokens back instead of showing the call to the user.
+    """
+    head = partial_reply.lstrip().upper()
+    return head.startswith(TOOL_CALL_PREFIX) or TOOL_CALL_PREFIX.startswith(head)
+
+
+def parse_tool_call(reply):
+    """
+    Returns the search query if the model answered with `TOOL_CALL: <query>`, else None.
+    """
+    match = TOOL_CALL_RE.match(reply or '')
+    if not match:
+        return None
+    lines = match.group(1).strip().splitlines()
+    return (lines[0].strip() or None) if lines else None
@@ -0,0 +1,192 @@
+import asyncio
+import atexit
+import json
+import re
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+
+from . import llm_cache
+
+# One sync client for the whole process, one async client per event loop
+# (httpx async pools are bound to the loop that created them).
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+# Long-lived loop for async work started from sync views (see run_sync)
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _headers():
+    return {
+        'Authorization': f'Bearer {settings.GROQ_API_KEY}',
+        'Content-Type': 'application/json',
+    }
+
+
+def get_timeout(task):
+    """
+    Returns the httpx timeout configured for a task type in settings.LLM_TIMEOUTS.
+    """
+    timeouts = settings.LLM_TIMEOUTS
+    seconds = timeouts.get(task, timeouts['default'])
+    return httpx.Timeout(seconds, connect=settings.LLM_CONNECT_TIMEOUT)
+
+
+def get_client() -> httpx.Client:
+    """
+    Returns the process-wide pooled client used by sync views.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    http2=settings.LLM_HTTP2,
+                    limits=_limits(),
+                    headers=_headers(),
+                )
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Returns the pooled async client for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            http2=settings.LLM_HTTP2,
+            limits=_limits(),
+            headers=_headers(),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_async_client():
+    """
+    Closes the async client of the running loop. Only needed for short-lived
+    loops; sync views should use run_sync so the client outlives the request.
+    """
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _shutdown_loop():
+    loop = _loop
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(aclose_async_client(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-loop', daemon=True).start()
+                atexit.register(_shutdown_loop)
+                _loop = loop
+    return _loop
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine from sync code on a process-wide background loop and
+    returns its result. Unlike asyncio.run, the loop (and so its pooled async
+    client with warm HTTP/2 connections) survives across requests.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def build_payload(messages, **options):
+    """
+    Builds a chat completion payload with the configured model.
+    Extra options (max_tokens, temperature, ...) are passed through.
+    """
+    payload = {"model": settings.GROQ_MODEL, "messages": messages}
+    payload.update({k: v for k, v in options.items() if v is not None})
+    return payload
+
+
+def _content(response):
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+
+def chat_completion(messages, task='default', cache=True, **options) -> str:
+    """
+    Sends a chat completion over the shared pool and returns the message content.
+    Tasks listed in settings.LLM_CACHE are answered from the response cache when possible.
+    Raises on transport or HTTP errors so callers keep their own fallbacks.
+    """
+    payload = build_payload(messages, **options)
+    if cache:
+        cached = llm_cache.lookup(task, payload)
+        if cached is not None:
+            return cached
+    response = get_client().post(settings.GROQ_API_URL, json=payload, timeout=get_timeout(task))
+    content = _content(response)
+    if cache:
+        llm_cache.store(task, payload, content)
+    return content
+
+
+async def achat_completion(messages, task='default', cache=True, **options) -> str:
+    """
+    Async counterpart of chat_completion.
+    """
+    payload = build_payload(messages, **options)
+    if cache:
+        cached = await llm_cache.alookup(task, payload)
+        if cached is not None:
+            return cached
+    response = await get_async_client().post(settings.GROQ_API_URL, json=payload, timeout=get_timeout(task))
+    content = _content(response)
+    if cache:
+        await llm_cache.astore(task, payload, content)
+    return content
+
+
+async def astream_chat_completion(messages, task='default', **options):
+    """
+    Requests a streamed completion and yields content deltas as they arrive.
+    Streams bypass the response cache.
+    """
+    payload = build_payload(messages, stream=True, **options)
+    client = get_async_client()
+    async with client.stream('POST', settings.GROQ_API_URL, json=payload, timeout=get_timeout(task)) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            choices = json.loads(data).get('choices') or [{}]
+            delta = choices[0].get('delta', {}).get('content')
+            if delta:
+                yield delta
+
+
+def parse_json_object(content):
+    """
+    Parses the first {...} block out of a model reply, falling back to the whole reply.
+    """
+    match = re.search(r'\{.*\}', content, re.DOTALL)
+    return json.loads(match.group(0)) if match else json.loads(content)
@@ -0,0 +1,179 @@
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+
+from . import mongo
+
+
+class LRUCache:
+    """
+    Thread-safe bounded LRU with per-entry expiry.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory = {}
+_memory_lock = threading.Lock()
+_collection = None
+_collection_lock = threading.Lock()
+
+
+def task_config(task):
+    """
+    Returns the cache settings for a task, or None when the task is not cached.
+    """
+    config = settings.LLM_CACHE
+    if not config.get('enabled', True):
+        return None
+    return config['tasks'].get(task)
+
+
+def _memory_for(task, config):
+    cache = _memory.get(task)
+    if cache is None:
+        with _memory_lock:
+            cache = _memory.setdefault(task, LRUCache(config['max_entries']))
+    return cache
+
+
+def _get_collection():
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                _collection = mongo.get_db()[settings.LLM_CACHE['collection']]
+    return _collection
+
+
+def _material(payload):
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+
+
+def cache_key(payload):
+    """
+    Content address of a completion request: sha256 over model, messages and options.
+    """
+    return hashlib.sha256(b'key:' + _material(payload)).hexdigest()
+
+
+def _fernet(payload):
+    # Entries in Mongo are sealed with a key derived from the prompt itself,
+    # so only a caller holding the same plaintext prompt can read them back.
+    digest = hashlib.sha256(b'enc:' + _material(payload)).digest()
+    return Fernet(base64.urlsafe_b64encode(digest))
+
+
+def _fetch(payload, key):
+    try:
+        doc = _get_collection().find_one({'_id': key})
+    except Exception as e:
+        print(f"[llm_cache] Read failed: {e}")
+        return None
+    if not doc or doc['expires_at'] < datetime.utcnow():
+        return None
+    try:
+        return _fernet(payload).decrypt(doc['content'].encode()).decode()
+    except InvalidToken:
+        return None
+
+
+def _persist(payload, key, task, content, config):
+    try:
+        _get_collection().replace_one(
+            {'_id': key},
+            {
+                '_id': key,
+                'task': task,
+                'content': _fernet(payload).encrypt(content.encode()).decode(),
+                'expires_at': datetime.utcnow() + timedelta(seconds=config['ttl']),
+            },
+            upsert=True
+        )
+    except Exception as e:
+        print(f"[llm_cache] Write failed: {e}")
+
+
+def lookup(task, payload):
+    """
+    Looks the payload up in memory, then in Mongo. Returns the cached content or None.
+    """
+    config = task_config(task)
+    if config is None:
+        return None
+    key = cache_key(payload)
+    memory = _memory_for(task, config)
+    content = memory.get(key)
+    if content is None and config.get('persist', True):
+        content = _fetch(payload, key)
+        if content is not None:
+            memory.set(key, content, config['ttl'])
+    return content
+
+
+def store(task, payload, content):
+    config = task_config(task)
+    if config is None:
+        return
+    key = cache_key(payload)
+    _memory_for(task, config).set(key, content, config['ttl'])
+    if config.get('persist', True):
+        _persist(payload, key, task, content, config)
+
+
+async def alookup(task, payload):
+    config = task_config(task)
+    if config is None:
+        return None
+    content = _memory_for(task, config).get(cache_key(payload))
+    if content is None and config.get('persist', True):
+        content = await asyncio.to_thread(lookup, task, payload)
+    return content
+
+
+async def astore(task, payload, content):
+    if task_config(task) is not None:
+        await asyncio.to_thread(store, task, payload, content)
+
+
+def clear_memory():
+    with _memory_lock:
+        for cache in _memory.values():
+            cache.clear()
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from pymongo.errors import DuplicateKeyError
+
+from app import mongo, mongo_indexes
+from users.crypt import decrypt_many, message_digest
+
+
+class Command(BaseCommand):
+    help = "Set the dedupe `digest` on bookmarks saved before it existed and report (or remove) duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--remove-duplicates', action='store_true',
+            help="Delete legacy bookmarks that duplicate an already digested one (the oldest copy is kept)."
+        )
+
+    def handle(self, *args, **options):
+        db = mongo.get_db()
+        mongo_indexes.ensure_indexes(db, collections=('bookmarks',))
+        updated = duplicates = removed = 0
+
+        legacy = {'digest': {'$exists': False}}
+        for user_id in db.bookmarks.distinct('fingerprint', legacy):
+            # Oldest first, so the copy that keeps the digest is the original bookmark
+            docs = list(db.bookmarks.find(dict(legacy, fingerprint=user_id)).sort([('created_at', 1), ('_id', 1)]))
+            for doc in decrypt_many(docs, user_id):
+                digest = message_digest(doc.get('message'), user_id)
+                try:
+                    db.bookmarks.update_one({'_id': doc['_id']}, {'$set': {'digest': digest}})
+                    updated += 1
+                except DuplicateKeyError:
+                    duplicates += 1
+                    if options['remove_duplicates']:
+                        db.bookmarks.delete_one({'_id': doc['_id']})
+                        db.search_tokens.delete_many({'user_id': user_id, 'source': 'bookmark', 'ref': doc['_id']})
+                        removed += 1
+                    else:
+                        self.stdout.write(f"duplicate    bookmark {doc['_id']} of {user_id}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Set {updated} digests; {duplicates} duplicates found, {removed} removed."
+        ))
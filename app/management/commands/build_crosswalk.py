@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app import crosswalk
+
+
+class Command(BaseCommand):
+    help = "Compile the MOS -> civilian keyword crosswalk source into its index file."
+
+    def handle(self, *args, **options):
+        compiled = crosswalk.build_index_file()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {settings.MOS_CROSSWALK_INDEX_PATH}: {len(compiled['codes'])} codes, "
+            f"{len(compiled['grades'])} pay grades, {len(compiled['terms'])} terms."
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from app import mongo, mongo_indexes, search_index
+from users.crypt import decrypt_many
+
+
+class Command(BaseCommand):
+    help = "Backfill the chat/bookmark search index for messages stored before it existed."
+
+    def handle(self, *args, **options):
+        db = mongo.get_db()
+        mongo_indexes.ensure_indexes(db, collections=('search_tokens',))
+        total = 0
+
+        for user_id in db.chat_buckets.distinct('user_id'):
+            for doc in db.chat_buckets.find({'user_id': user_id}, {'messages': 1, 'created_at': 1}):
+                for msg in decrypt_many(doc['messages'], user_id):
+                    total += search_index.index_text(
+                        db, user_id, 'chat', msg['seq'], msg.get('message'), doc.get('created_at')
+                    )
+
+        for user_id in db.bookmarks.distinct('fingerprint'):
+            docs = list(db.bookmarks.find({'fingerprint': user_id}))
+            for doc in decrypt_many(docs, user_id):
+                total += search_index.index_text(
+                    db, user_id, 'bookmark', doc['_id'], doc.get('message'), doc.get('created_at')
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} search tokens."))
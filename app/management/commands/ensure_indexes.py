@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from app import mongo, mongo_indexes
+
+
+class Command(BaseCommand):
+    help = "Create the declared Mongo indexes (app/mongo_indexes.py) and report missing or extra ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report; do not create or drop anything.")
+        parser.add_argument('--drop-extra', action='store_true', help="Drop indexes that are not declared.")
+
+    def handle(self, *args, **options):
+        report = mongo_indexes.ensure_indexes(
+            mongo.get_db(), create=not options['check'], drop_extra=options['drop_extra']
+        )
+        for section in ('created', 'dropped', 'missing', 'extra', 'conflicting', 'errors'):
+            for entry in report[section]:
+                self.stdout.write(f"{section:<12} {entry}")
+        summary = f"{len(report['present'])} present, {len(report['created'])} created, " \
+                  f"{len(report['missing'])} missing, {len(report['extra'])} extra."
+        if report['errors'] or report['conflicting']:
+            self.stdout.write(self.style.ERROR(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
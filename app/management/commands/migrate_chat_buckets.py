@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app import chat_store, mongo, mongo_indexes
+
+
+class Command(BaseCommand):
+    help = "Move legacy chat_history `conversation` arrays into chat_buckets documents."
+
+    def handle(self, *args, **options):
+        db = mongo.get_db()
+        mongo_indexes.ensure_indexes(db, collections=('chat_history', 'chat_buckets'))
+        users = db.chat_history.distinct('user_id', {'conversation': {'$exists': True}})
+        total = 0
+        for user_id in users:
+            total += chat_store.migrate_legacy_conversation(db, user_id)
+        self.stdout.write(self.style.SUCCESS(f"Migrated {total} messages for {len(users)} users."))
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+import weakref
+from collections import Counter
+
+from django.conf import settings
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+# One pymongo client for the whole process, one motor client per event loop
+# (motor binds to the loop it is first used on). Each client owns a connection
+# pool and monitor threads, so handlers must never construct their own.
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class PoolStats(ConnectionPoolListener):
+    """
+    Counts connection pool events for the clients it is registered on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def _incr(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['open'] = counts.get('connections_created', 0) - counts.get('connections_closed', 0)
+        counts['in_use'] = counts.get('checked_out', 0) - counts.get('checked_in', 0)
+        return counts
+
+    def pool_created(self, event):
+        self._incr('pools_created')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr('pools_cleared')
+
+    def pool_closed(self, event):
+        self._incr('pools_closed')
+
+    def connection_created(self, event):
+        self._incr('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr('check_out_failed')
+
+    def connection_checked_out(self, event):
+        self._incr('checked_out')
+
+    def connection_checked_in(self, event):
+        self._incr('checked_in')
+
+
+sync_stats = PoolStats()
+async_stats = PoolStats()
+
+
+def _client_options():
+    return {
+        'maxPoolSize': settings.MONGO_MAX_POOL_SIZE,
+        'minPoolSize': settings.MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': settings.MONGO_MAX_IDLE_TIME_MS,
+        'connectTimeoutMS': settings.MONGO_CONNECT_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'socketTimeoutMS': settings.MONGO_SOCKET_TIMEOUT_MS,
+        'readPreference': settings.MONGO_READ_PREFERENCE,
+    }
+
+
+def get_client() -> MongoClient:
+    """
+    Returns the process-wide pymongo client used by sync views and threads.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(settings.MONGO_URI, event_listeners=[sync_stats], **_client_options())
+    return _client
+
+
+def get_db():
+    return get_client()[settings.MONGO_DB_NAME]
+
+
+def get_async_client() -> AsyncIOMotorClient:
+    """
+    Returns the motor client for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncIOMotorClient(settings.MONGO_URI, event_listeners=[async_stats], **_client_options())
+        _async_clients[loop] = client
+    return client
+
+
+def get_async_db():
+    return get_async_client()[settings.MONGO_DB_NAME]
+
+
+def ping():
+    """
+    Round-trips a ping through the sync client. Returns the latency in milliseconds.
+    """
+    start = time.perf_counter()
+    get_client().admin.command('ping')
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def health():
+    """
+    Reachability plus pool counters for both client kinds, for the health endpoint.
+    """
+    try:
+        status = {'ok': True, 'latency_ms': ping()}
+    except Exception as e:
+        status = {'ok': False, 'error': str(e)}
+    status['pools'] = {
+        'sync': sync_stats.snapshot(),
+        'async': dict(async_stats.snapshot(), clients=len(_async_clients)),
+    }
+    return status
+
+
+def close():
+    """
+    Closes every registered client; the next get_* call reconnects.
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+    for client in list(_async_clients.values()):
+        client.close()
+    _async_clients.clear()
@@ -0,0 +1,117 @@
+from collections import namedtuple
+
+from django.conf import settings
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+# Every index the application relies on, in one place. Collections are queried
+# per user (fingerprint / user_id), so each one leads with that field; compound
+# indexes also serve equality lookups on their prefix. Applied idempotently by
+# `manage.py ensure_indexes` and, when MONGO_ENSURE_INDEXES_ON_STARTUP is set,
+# by AppConfig.ready.
+
+IndexSpec = namedtuple('IndexSpec', ['collection', 'keys', 'options'])
+
+# Options compared when deciding whether an existing index matches its spec.
+_COMPARED_OPTIONS = ('unique', 'expireAfterSeconds', 'partialFilterExpression', 'sparse')
+
+
+def index(collection, *keys, **options):
+    keys = tuple((key, ASCENDING) if isinstance(key, str) else tuple(key) for key in keys)
+    return IndexSpec(collection, keys, options)
+
+
+def declared_indexes():
+    return (
+        index('user_data', 'fingerprint'),
+        index('bio_data', 'fingerprint', unique=True),
+        # Chat history (app/chat_store.py); the header index also serves /chats/all
+        index('chat_history', 'user_id', unique=True),
+        index('chat_buckets', 'user_id', 'bucket', unique=True),
+        index('chat_summaries', 'user_id', unique=True),
+        # Bookmarks: digest dedupe (partial: older bookmarks have no digest) and pagination
+        index('bookmarks', 'fingerprint', 'digest', unique=True,
+              partialFilterExpression={'digest': {'$exists': True}}),
+        index('bookmarks', 'fingerprint', ('created_at', DESCENDING), ('_id', DESCENDING)),
+        # Blind search index (app/search_index.py)
+        index('search_tokens', 'user_id', 'token', 'source'),
+        index('search_tokens', 'user_id', 'source', 'ref', 'token', unique=True),
+        # Per-user search result caches, keyed by the result's URL
+        index('cache_job_db', 'fingerprint', 'url'),
+        index('cache_mentor_db', 'fingerprint', 'profile_url'),
+        index('cache_community_db', 'fingerprint', 'link'),
+        index('mos_doc', 'code'),
+        index(settings.LLM_CACHE['collection'], 'expires_at', expireAfterSeconds=0),
+    )
+
+
+def _comparable(options):
+    return {key: options[key] for key in _COMPARED_OPTIONS if key in options}
+
+
+def _existing(collection):
+    """
+    Returns {keys: (name, options)} for the collection's indexes, without the _id index.
+    """
+    found = {}
+    for name, info in collection.index_information().items():
+        if name == '_id_':
+            continue
+        keys = tuple((field, int(direction)) for field, direction in info['key'])
+        found[keys] = (name, _comparable(info))
+    return found
+
+
+def ensure_indexes(db, collections=None, create=True, drop_extra=False):
+    """
+    Brings the database in line with declared_indexes(). Only the named
+    collections are touched when `collections` is given. With create=False
+    nothing is changed and the report only describes the differences.
+
+    Returns a report dict of lists: created, present, missing, conflicting,
+    extra, dropped and errors. Index entries are "collection: keys" strings.
+    """
+    report = {key: [] for key in ('created', 'present', 'missing', 'conflicting', 'extra', 'dropped', 'errors')}
+    specs = {}
+    for spec in declared_indexes():
+        if collections is None or spec.collection in collections:
+            specs.setdefault(spec.collection, []).append(spec)
+
+    for name, collection_specs in specs.items():
+        collection = db[name]
+        try:
+            existing = _existing(collection)
+        except PyMongoError as e:
+            report['errors'].append(f"{name}: {e}")
+            continue
+
+        for spec in collection_specs:
+            label = f"{name}: {spec.keys}"
+            if spec.keys in existing:
+                _, options = existing.pop(spec.keys)
+                if options == _comparable(spec.options):
+                    report['present'].append(label)
+                else:
+                    # Same keys, different options: needs a manual drop first
+                    report['conflicting'].append(f"{label} has {options}, declared {_comparable(spec.options)}")
+                continue
+            if not create:
+                report['missing'].append(label)
+                continue
+            try:
+                collection.create_index(list(spec.keys), **spec.options)
+                report['created'].append(label)
+            except PyMongoError as e:
+                report['errors'].append(f"{label}: {e}")
+
+        for keys, (index_name, _) in existing.items():
+            label = f"{name}: {keys}"
+            if drop_extra and create:
+                try:
+                    collection.drop_index(index_name)
+                    report['dropped'].append(label)
+                except PyMongoError as e:
+                    report['errors'].append(f"{label}: {e}")
+            else:
+                report['extra'].append(label)
+    return report
@@ -0,0 +1,233 @@
+import re
+import threading
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+from . import mos_registry
+
+# Noise-tolerant MOS lookup over the registry snapshot. Codes coming out of OCR
+# or the LLM are often spaced ("11 B"), carry a skill level / identifier suffix
+# ("11B10") or have letter-for-digit swaps ("25B2O"). They are resolved by, in
+# order: exact and normalized match, digit look-alike repair, the generic AFSC
+# skill level ("3D032" -> "3D0X2"), trimming the suffix back to a known prefix,
+# then trigram similarity over codes and titles.
+# Each step carries a lower confidence. The index is rebuilt only when the
+# registry snapshot changes.
+
+MosMatch = namedtuple('MosMatch', ['entry', 'confidence', 'method'])
+
+_CODE_JUNK_RE = re.compile(r'[^A-Z0-9]')
+_TEXT_JUNK_RE = re.compile(r'[^a-z0-9]+')
+# Army, Marine Corps and Air Force codes never use I or O, so once an exact match
+# has failed they are read as OCR noise for 1 and 0 -- but only when the result
+# has one of those shapes. Navy ratings ("IT2", "CTI") are letters and are left alone.
+_DIGIT_LOOKALIKES = str.maketrans({'O': '0', 'I': '1'})
+_REPAIRABLE_SHAPES = (
+    re.compile(r'^\d{2}[A-Z](\d[A-Z0-9]{0,3})?$'),  # Army MOS, optionally with skill level: 11B, 25B20
+    re.compile(r'^\d{4}$'),  # Marine Corps MOS: 0311
+    re.compile(r'^[A-Z]?\d[A-Z]\d[X\d]\d[A-Z]?$'),  # AFSC: 1N0X1, 3D032
+)
+_AFSC_RE = re.compile(r'^(\d[A-Z]\d)[X\d](\d)$')
+# Shortest code prefix tried when trimming suffixes ("IT2" -> "IT"); shared with the crosswalk
+MIN_PREFIX = 2
+
+CONFIDENCE = {
+    'exact': 1.0,
+    'normalized': 0.97,
+    'skill_level': 0.95,
+    'repaired': 0.9,
+    'prefix': 0.85,
+    'repaired_prefix': 0.8,
+}
+CODE_TRIGRAM_WEIGHT = 0.7
+TITLE_TRIGRAM_WEIGHT = 0.85
+
+
+def normalize_code(code):
+    return _CODE_JUNK_RE.sub('', str(code or '').upper())
+
+
+def repair_code(code):
+    """
+    Swaps the letters O and I for the digits 0 and 1 when that gives an Army,
+    Marine Corps or AFSC code shape; other codes are returned unchanged.
+    """
+    repaired = code.translate(_DIGIT_LOOKALIKES)
+    if repaired != code and any(shape.match(repaired) for shape in _REPAIRABLE_SHAPES):
+        return repaired
+    return code
+
+
+def generic_afsc(code):
+    """
+    The skill-level wildcard form of an AFSC ("3D032" -> "3D0X2"), or None.
+    """
+    match = _AFSC_RE.match(code)
+    return f"{match.group(1)}X{match.group(2)}" if match else None
+
+
+def normalize_title(title):
+    return _TEXT_JUNK_RE.sub(' ', str(title or '').lower()).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TrigramIndex:
+    __slots__ = ('postings', 'sizes')
+
+    def __init__(self, items):
+        postings = {}
+        sizes = {}
+        for key, text in items:
+            grams = trigrams(text)
+            sizes[key] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(key)
+        self.postings = {gram: tuple(keys) for gram, keys in postings.items()}
+        self.sizes = sizes
+
+    def best(self, text, accept=None):
+        """
+        Returns (key, dice) of the most similar indexed text, or (None, 0.0).
+        """
+        grams = trigrams(text)
+        overlap = Counter()
+        for gram in grams:
+            overlap.update(self.postings.get(gram, ()))
+        best_key, best_score = None, 0.0
+        for key, shared in overlap.items():
+            if accept is not None and not accept(key):
+                continue
+            score = 2 * shared / (len(grams) + self.sizes[key])
+            if score > best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
+
+
+class MosIndex:
+    """
+    Precomputed lookup structures for one registry snapshot.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        # (branch, normalized code) -> entry; branch None holds every code
+        self.codes = {}
+        for branch, entries in registry.by_branch.items():
+            for code, entry in entries.items():
+                self.codes.setdefault((branch, normalize_code(code)), entry)
+        for code, entry in registry.by_code.items():
+            self.codes.setdefault((None, normalize_code(code)), entry)
+        entries = {(entry.branch, entry.code): entry for entry in self.codes.values()}
+        self.entries = entries
+        self.code_grams = _TrigramIndex((key, normalize_code(key[1])) for key in entries)
+        self.title_grams = _TrigramIndex(
+            (key, normalize_title(entry.title)) for key, entry in entries.items() if entry.title
+        )
+
+    def _scope(self, branch):
+        key = mos_registry.branch_key(branch) if branch else None
+        return key if key in self.registry.by_branch else None
+
+    def _exact(self, code, scope):
+        return self.codes.get((scope, code))
+
+    def _prefix(self, code, scope):
+        for end in range(len(code) - 1, MIN_PREFIX - 1, -1):
+            entry = self.codes.get((scope, code[:end]))
+            if entry is not None:
+                return entry
+        return None
+
+    def match_code(self, raw, scope):
+        code = normalize_code(raw)
+        if not code:
+            return None
+        repaired = repair_code(code)
+        entry = self._exact(code, scope)
+        if entry is not None:
+            return MosMatch(entry, CONFIDENCE['exact' if entry.code == raw else 'normalized'], 'code')
+        generic = generic_afsc(repaired)
+        steps = [
+            ('repaired', lambda: self._exact(repaired, scope) if repaired != code else None),
+            ('skill_level', lambda: self._exact(generic, scope) if generic and generic != repaired else None),
+            ('prefix', lambda: self._prefix(code, scope)),
+            ('repaired_prefix', lambda: self._prefix(repaired, scope) if repaired != code else None),
+        ]
+        for method, step in steps:
+            entry = step()
+            if entry is not None:
+                return MosMatch(entry, CONFIDENCE[method], method)
+        key, score = self.code_grams.best(repaired, self._accept(scope))
+        if key is not None:
+            return MosMatch(self.entries[key], round(score * CODE_TRIGRAM_WEIGHT, 3), 'code_trigram')
+        return None
+
+    def match_title(self, raw, scope):
+        title = normalize_title(raw)
+        if not title:
+            return None
+        key, score = self.title_grams.best(title, self._accept(scope))
+        if key is None:
+            return None
+        return MosMatch(self.entries[key], round(score * TITLE_TRIGRAM_WEIGHT, 3), 'title_trigram')
+
+    def _accept(self, scope):
+        if scope is None:
+            return None
+        return lambda key: key[0] == scope
+
+    def match(self, code=None, title=None, branch=None):
+        scope = self._scope(branch)
+        candidates = [m for m in (self.match_code(code, scope), self.match_title(title, scope)) if m]
+        if not candidates:
+            return None
+        best = max(candidates, key=lambda m: m.confidence)
+        if len(candidates) == 2 and candidates[0].entry == candidates[1].entry:
+            # Code and title agree: trust the pair more than either alone
+            best = best._replace(confidence=min(1.0, round(best.confidence + 0.1, 3)))
+        return best
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index() -> MosIndex:
+    global _index
+    registry = mos_registry.get_registry()
+    if _index is None or _index.registry is not registry:
+        with _lock:
+            if _index is None or _index.registry is not registry:
+                _index = MosIndex(registry)
+    return _index
+
+
+def match(code=None, title=None, branch=None, min_confidence=None):
+    """
+    Best registry entry for a noisy code and/or title, or None below min_confidence
+    (settings.MOS_MATCH_MIN_CONFIDENCE by default).
+    """
+    if min_confidence is None:
+        min_confidence = settings.MOS_MATCH_MIN_CONFIDENCE
+    found = get_index().match(code, title, branch)
+    return found if found and found.confidence >= min_confidence else None
+
+
+def enrich(mos, branch=None):
+    """
+    Fills a mos_history item from its best match: canonical code, title,
+    description and match_confidence. Returns the match, or None.
+    """
+    found = match(mos.get('code'), mos.get('title'), branch)
+    if found is None:
+        return None
+    mos['code'] = found.entry.code
+    mos['title'] = found.entry.title or mos.get('title')
+    mos['description'] = found.entry.description or ''
+    mos['match_confidence'] = found.confidence
+    return found
@@ -0,0 +1,144 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+
+from django.conf import settings
+
+from . import mongo
+
+# MOS (military occupational specialty) reference data, loaded once per
+# process from the `mos_doc` collection plus any per-branch
+# users/mos_data/<branch>_mos.json files, and shared read-only by the job
+# search view and document enrichment. The loaded snapshot is replaced, never
+# mutated, when the version stamp in `registry_versions` changes; the stamp is
+# checked at most every MOS_REGISTRY_CHECK_INTERVAL seconds.
+
+MosEntry = namedtuple('MosEntry', ['code', 'branch', 'title', 'description'])
+
+VERSION_COLLECTION = 'registry_versions'
+VERSION_ID = 'mos'
+
+_EMPTY = MappingProxyType({})
+
+
+class MosRegistry:
+    """
+    Immutable snapshot: entries by code, and by branch then code.
+    """
+    __slots__ = ('version', 'by_code', 'by_branch')
+
+    def __init__(self, version, entries):
+        by_code = {}
+        by_branch = {}
+        for entry in entries:
+            by_code.setdefault(entry.code, entry)
+            by_branch.setdefault(entry.branch, {}).setdefault(entry.code, entry)
+        self.version = version
+        self.by_code = MappingProxyType(by_code)
+        self.by_branch = MappingProxyType({branch: MappingProxyType(codes) for branch, codes in by_branch.items()})
+
+    def get(self, code, branch=None):
+        if branch is not None:
+            return self.branch(branch).get(code)
+        return self.by_code.get(code)
+
+    def branch(self, name):
+        return self.by_branch.get(branch_key(name), _EMPTY)
+
+    def __len__(self):
+        return len(self.by_code)
+
+    def __repr__(self):
+        return f"<MosRegistry v{self.version} {len(self)} codes>"
+
+
+_registry = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def branch_key(name):
+    return (name or '').strip().lower().replace(' ', '_')
+
+
+def _entry(item, branch=None):
+    return MosEntry(
+        code=str(item['code']).strip(),
+        branch=branch_key(branch or item.get('branch') or item.get('service')),
+        title=item.get('title'),
+        description=item.get('description'),
+    )
+
+
+def _seed(collection):
+    """
+    Fills an empty mos_doc collection from the bundled mos_database.json, if present.
+    """
+    path = settings.MOS_DATABASE_PATH
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as f:
+        items = json.load(f)
+    if not isinstance(items, list):
+        raise ValueError(f"Invalid format in {os.path.basename(path)}")
+    if items:
+        collection.insert_many(items)
+        bump_version()
+
+
+def _load_entries():
+    db = mongo.get_db()
+    collection = db['mos_doc']
+    if collection.estimated_document_count() == 0:
+        _seed(collection)
+    entries = [
+        _entry(item)
+        for item in collection.find({}, {'_id': 0, 'code': 1, 'branch': 1, 'service': 1, 'title': 1, 'description': 1})
+        if item.get('code')
+    ]
+    for path in sorted(glob.glob(os.path.join(settings.MOS_DATA_DIR, '*_mos.json'))):
+        branch = os.path.basename(path).split('_')[0]
+        with open(path, 'r') as f:
+            entries.extend(_entry(item, branch) for item in json.load(f) if item.get('code'))
+    return entries
+
+
+def current_version():
+    doc = mongo.get_db()[VERSION_COLLECTION].find_one({'_id': VERSION_ID})
+    return doc['version'] if doc else 0
+
+
+def bump_version():
+    """
+    Marks the MOS data as changed; every process reloads on its next check.
+    """
+    mongo.get_db()[VERSION_COLLECTION].update_one(
+        {'_id': VERSION_ID},
+        {'$inc': {'version': 1}, '$set': {'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def get_registry() -> MosRegistry:
+    """
+    Returns the current MOS snapshot, loading it on first use and reloading
+    when the version stamp has moved since the last check.
+    """
+    global _registry, _checked_at
+    now = time.monotonic()
+    if _registry is not None and now - _checked_at < settings.MOS_REGISTRY_CHECK_INTERVAL:
+        return _registry
+    with _lock:
+        if _registry is None or now - _checked_at >= settings.MOS_REGISTRY_CHECK_INTERVAL:
+            version = current_version()
+            if _registry is None or version != _registry.version:
+                entries = _load_entries()
+                # Seeding bumps the stamp; read it again so we do not reload next time
+                _registry = MosRegistry(current_version(), entries)
+            _checked_at = now
+    return _registry
@@ -0,0 +1,56 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from pymongo import DESCENDING
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc, sort_field):
+    raw = json.dumps({'t': doc[sort_field].isoformat(), 'id': str(doc['_id'])})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(raw['t']), ObjectId(raw['id'])
+    except (ValueError, KeyError, TypeError, AttributeError, InvalidId) as e:
+        raise InvalidCursor("Invalid pagination cursor.") from e
+
+
+def page_limit(value):
+    """
+    Parses the requested page size, clamped to settings.PAGINATION_MAX_LIMIT.
+    """
+    try:
+        limit = int(value) if value not in (None, '') else settings.PAGINATION_DEFAULT_LIMIT
+    except (TypeError, ValueError):
+        limit = settings.PAGINATION_DEFAULT_LIMIT
+    return max(1, min(limit, settings.PAGINATION_MAX_LIMIT))
+
+
+def paginate(collection, owner_field, owner, sort_field, cursor=None, limit=None, projection=None):
+    """
+    Keyset pagination, newest first, over (sort_field, _id). Returns (docs, next_cursor).
+    Reads at most limit + 1 documents, served by the (owner_field, sort_field, _id) index (app/mongo_indexes.py).
+    """
+    query = {owner_field: owner}
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        query['$or'] = [
+            {sort_field: {'$lt': last_value}},
+            {sort_field: last_value, '_id': {'$lt': last_id}},
+        ]
+    docs = list(
+        collection.find(query, projection)
+        .sort([(sort_field, DESCENDING), ('_id', DESCENDING)])
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(docs[limit - 1], sort_field) if len(docs) > limit else None
+    return docs[:limit], next_cursor
@@ -0,0 +1,31 @@
+import asyncio
+from collections import namedtuple
+
+# A pipeline stage: an async callable taking one item and returning the item for
+# the next stage (or None to drop it), run at most `concurrency` at a time.
+Stage = namedtuple('Stage', ['name', 'handler', 'concurrency'])
+
+
+async def run_pipeline(items, stages):
+    """
+    Pushes every item through the stages in order. Each item moves on as soon as
+    its previous stage is done, so different items sit in different stages at the
+    same time and total latency tracks the slowest item rather than the sum.
+    Items dropped or failing in any stage are left out; order of `items` is kept.
+    """
+    semaphores = [asyncio.Semaphore(stage.concurrency) for stage in stages]
+
+    async def flow(item):
+        for stage, semaphore in zip(stages, semaphores):
+            async with semaphore:
+                try:
+                    item = await stage.handler(item)
+                except Exception as e:
+                    print(f"Pipeline stage '{stage.name}' failed: {e}")
+                    return None
+            if item is None:
+                return None
+        return item
+
+    results = await asyncio.gather(*(flow(item) for item in items))
+    return [result for result in results if result is not None]
@@ -0,0 +1,72 @@
+import json
+import math
+
+# Rough average for English text on Llama-family tokenizers. Good enough for
+# budgeting; we only need to stay safely under the context window.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, budget, marker=' …'):
+    """
+    Cuts text down to roughly `budget` tokens, on a word boundary when possible.
+    """
+    if not text or estimate_tokens(text) <= budget:
+        return text
+    limit = max(budget * CHARS_PER_TOKEN - len(marker), 0)
+    cut = text[:limit]
+    space = cut.rfind(' ')
+    if space > limit * 0.8:
+        cut = cut[:space]
+    return cut + marker
+
+
+def _prune(value):
+    if isinstance(value, dict):
+        pruned = {k: _prune(v) for k, v in value.items() if k not in ('_id', 'fingerprint')}
+        return {k: v for k, v in pruned.items() if v not in (None, '', [], {})}
+    if isinstance(value, list):
+        return [v for v in (_prune(item) for item in value) if v not in (None, '', [], {})]
+    return value
+
+
+def compact_profile(profile, budget):
+    """
+    Serializes the profile without indentation or empty fields, then fits it to the budget.
+    """
+    if not profile:
+        return "{}"
+    text = json.dumps(_prune(profile), separators=(',', ':'), default=str)
+    return truncate_to_tokens(text, budget)
+
+
+def format_message(msg):
+    return f"{msg['role'].capitalize()}: {msg['message']}\n"
+
+
+def fit_history(chat_history, budget, max_messages, max_message_tokens):
+    """
+    Keeps the newest messages that fit in `budget` tokens (and `max_messages`).
+    Returns (window, overflow): overflow holds the older messages that did not
+    fit, oldest first, so they can be folded into the rolling summary.
+    """
+    window = []
+    used = 0
+    for msg in reversed(chat_history):
+        if len(window) >= max_messages:
+            break
+        msg = dict(msg, message=truncate_to_tokens(msg.get('message') or '', max_message_tokens))
+        cost = estimate_tokens(format_message(msg))
+        if used + cost > budget:
+            break
+        window.append(msg)
+        used += cost
+    window.reverse()
+    overflow = chat_history[:len(chat_history) - len(window)]
+    return window, overflow
+
@@ -0,0 +1,167 @@
+import base64
+import json
+import re
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError
+
+from users.crypt import keyed_digest
+
+from .pagination import InvalidCursor
+
+# Blind index over encrypted chat messages and bookmarks.
+#   search_tokens  one document per (user, source, ref, term):
+#                  user_id, source ('chat' | 'bookmark'), ref, token, created_at
+# `token` is a per-user keyed HMAC of a normalized term, so the collection can
+# be queried by equality without ever holding plaintext. `ref` is the chat
+# message `seq` or the bookmark `_id`. A query hashes its own terms the same
+# way and intersects postings on the (user_id, token) index; only the matched
+# messages are then fetched and decrypted.
+
+SOURCES = ('chat', 'bookmark')
+
+TERM_RE = re.compile(r"[a-z0-9]+(?:['’][a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in is it its me my "
+    "of on or so that the their them they this to was we what when where which who why "
+    "will with you your".split()
+)
+MIN_TERM_LENGTH = 2
+
+
+def normalize_terms(text):
+    """
+    Lowercased word terms of `text`, without stopwords or duplicates, in first-seen order.
+    """
+    terms = []
+    seen = set()
+    for term in TERM_RE.findall((text or '').lower()):
+        term = term.replace('’', "'")
+        if len(term) < MIN_TERM_LENGTH or term in STOPWORDS or term in seen:
+            continue
+        seen.add(term)
+        terms.append(term)
+    return terms
+
+
+def term_tokens(text, user_id):
+    # Domain-separated from the bookmark dedupe digest computed over the same key.
+    terms = normalize_terms(text)[:settings.SEARCH_MAX_TERMS]
+    return [keyed_digest(f"term:{term}", user_id) for term in terms]
+
+
+def message_text(message):
+    """
+    The readable text of a stored message. Bot replies are JSON
+    ([{"message": ..., "actions": [...]}]); only their "message" values are
+    kept, so the envelope keys and action links do not match every reply.
+    """
+    if isinstance(message, str):
+        if not message.lstrip().startswith(('[', '{')):
+            return message
+        try:
+            message = json.loads(message)
+        except ValueError:
+            return message
+    if isinstance(message, dict):
+        return message_text(message.get('message'))
+    if isinstance(message, list):
+        return '\n'.join(filter(None, (message_text(item) for item in message)))
+    return str(message) if message is not None else ''
+
+
+def _token_docs(user_id, source, ref, message, created_at=None):
+    created_at = created_at or datetime.utcnow()
+    return [
+        {'user_id': user_id, 'source': source, 'ref': ref, 'token': token, 'created_at': created_at}
+        for token in term_tokens(message_text(message), user_id)
+    ]
+
+
+def index_text(db, user_id, source, ref, message, created_at=None):
+    """
+    Writes the blind-index tokens for one message (text or a bot reply, see
+    message_text). Re-indexing the same ref is a no-op.
+    """
+    docs = _token_docs(user_id, source, ref, message, created_at)
+    if not docs:
+        return 0
+    try:
+        return len(db.search_tokens.insert_many(docs, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get('nInserted', 0)
+
+
+async def aindex_text(db, user_id, source, ref, message, created_at=None):
+    docs = _token_docs(user_id, source, ref, message, created_at)
+    if not docs:
+        return 0
+    try:
+        result = await db.search_tokens.insert_many(docs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        return e.details.get('nInserted', 0)
+
+
+def encode_cursor(created_at, source, ref):
+    raw = json.dumps({'t': created_at.isoformat(), 's': source, 'r': str(ref)})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Returns (created_at, source, ref) of the last hit on the previous page.
+    """
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        source = raw['s']
+        if source not in SOURCES:
+            raise ValueError(source)
+        # Chat refs are message seqs, bookmark refs ObjectIds
+        ref = int(raw['r']) if source == 'chat' else ObjectId(raw['r'])
+        return datetime.fromisoformat(raw['t']), source, ref
+    except (ValueError, KeyError, TypeError, AttributeError, InvalidId) as e:
+        raise InvalidCursor("Invalid pagination cursor.") from e
+
+
+def search_refs(db, user_id, query, sources=SOURCES, limit=20, cursor=None):
+    """
+    Resolves a keyword query to a page of [(source, ref)], newest first, and
+    the cursor of the next page (None on the last one). Every query term must
+    match. Raises InvalidCursor for a malformed cursor.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    tokens = term_tokens(query, user_id)
+    if not tokens:
+        return [], None
+    pipeline = [
+        {'$match': {'user_id': user_id, 'token': {'$in': tokens}, 'source': {'$in': list(sources)}}},
+        {'$group': {
+            '_id': {'source': '$source', 'ref': '$ref'},
+            'hits': {'$sum': 1},
+            'created_at': {'$max': '$created_at'},
+        }},
+        {'$match': {'hits': len(tokens)}},
+    ]
+    if after:
+        # Keyset on the sort order below: (created_at, source, ref), all descending
+        created_at, source, ref = after
+        pipeline.append({'$match': {'$or': [
+            {'created_at': {'$lt': created_at}},
+            {'created_at': created_at, '_id.source': {'$lt': source}},
+            {'created_at': created_at, '_id.source': source, '_id.ref': {'$lt': ref}},
+        ]}})
+    pipeline += [
+        {'$sort': {'created_at': DESCENDING, '_id.source': DESCENDING, '_id.ref': DESCENDING}},
+        {'$limit': limit + 1},
+    ]
+    docs = list(db.search_tokens.aggregate(pipeline))
+    next_cursor = None
+    if len(docs) > limit:
+        last = docs[limit - 1]
+        next_cursor = encode_cursor(last['created_at'], last['_id']['source'], last['_id']['ref'])
+    return [(doc['_id']['source'], doc['_id']['ref']) for doc in docs[:limit]], next_cursor
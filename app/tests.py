@@ -1,3 +1,373 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from bson import ObjectId
+from django.test import SimpleTestCase, override_settings
+from pymongo import UpdateOne
+
+from . import cache_writer, crosswalk, search_index
+from .llm_cache import LRUCache
+from .consumers import ChatConsumer
+from .intent import classify, parse_tool_call
+from .mos_match import MosIndex, generic_afsc, normalize_code, normalize_title, repair_code
+from .mos_registry import MosEntry, MosRegistry
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .prompt_budget import estimate_tokens, fit_history, truncate_to_tokens
+
+
+class ParseToolCallTests(SimpleTestCase):
+    def test_query(self):
+        self.assertEqual(parse_tool_call("TOOL_CALL: va home loan limits 2025"), "va home loan limits 2025")
+
+    def test_first_line_only(self):
+        self.assertEqual(parse_tool_call("  tool_call:  gi bill rates\nsomething else"), "gi bill rates")
+
+    def test_empty_query(self):
+        self.assertIsNone(parse_tool_call("TOOL_CALL:   "))
+        self.assertIsNone(parse_tool_call("TOOL_CALL:\n\n"))
+
+    def test_not_a_tool_call(self):
+        self.assertIsNone(parse_tool_call('[{"message": "Hello"}]'))
+        self.assertIsNone(parse_tool_call(None))
+
+
+class ClassifyTests(SimpleTestCase):
+    def test_greeting_skips_search(self):
+        intent = classify("thanks so much!")
+        self.assertEqual((intent.label, intent.needs_search, intent.reason), ('greeting', False, 'rule'))
+
+    def test_empty_message(self):
+        self.assertEqual(classify("   ").label, 'greeting')
+
+    def test_mental_health_rule(self):
+        intent = classify("I've been feeling really overwhelmed since I got out")
+        self.assertEqual((intent.label, intent.needs_search), ('mental_health', False))
+
+    def test_career_struggles_are_not_mental_health(self):
+        for message in ("I'm struggling to find a job after the Army", "so overwhelmed by the gi bill paperwork"):
+            with self.subTest(message=message):
+                intent = classify(message)
+                self.assertNotEqual(intent.label, 'mental_health')
+                self.assertTrue(intent.needs_search)
+
+    def test_crisis_phrases_always_route_to_mental_health(self):
+        self.assertEqual(classify("lost my job and I feel hopeless").label, 'mental_health')
+
+    def test_followup_needs_history(self):
+        self.assertEqual(classify("tell me more", chat_history=True).label, 'followup')
+        self.assertNotEqual(classify("tell me more", chat_history=False).reason, 'rule')
+
+    def test_search_topic(self):
+        intent = classify("how do i use my gi bill for college")
+        self.assertEqual(intent.label, 'education')
+        self.assertTrue(intent.needs_search)
+
+    def test_unknown_falls_back_to_search(self):
+        intent = classify("zzqx blorf")
+        self.assertEqual(intent.reason, 'fallback')
+        self.assertTrue(intent.needs_search)
+
+
+class MosNormalizationTests(SimpleTestCase):
+    def test_normalize_code(self):
+        self.assertEqual(normalize_code(" 11 b-10 "), "11B10")
+        self.assertEqual(normalize_code(None), "")
+
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title("Infantryman (Rifle)"), "infantryman rifle")
+
+    def test_repair_army_marine_and_afsc_shapes(self):
+        self.assertEqual(repair_code("IIB"), "11B")
+        self.assertEqual(repair_code("25B2O"), "25B20")
+        self.assertEqual(repair_code("O311"), "0311")
+        self.assertEqual(repair_code("1NOX1"), "1N0X1")
+
+    def test_navy_ratings_are_not_repaired(self):
+        self.assertEqual(repair_code("IT2"), "IT2")
+        self.assertEqual(repair_code("CTI"), "CTI")
+
+    def test_generic_afsc(self):
+        self.assertEqual(generic_afsc("3D032"), "3D0X2")
+        self.assertEqual(generic_afsc("3D0X2"), "3D0X2")
+        self.assertIsNone(generic_afsc("11B"))
+
+
+class MosIndexTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.index = MosIndex(MosRegistry(1, [
+            MosEntry('11B', 'army', 'Infantryman', ''),
+            MosEntry('25B', 'army', 'Information Technology Specialist', ''),
+            MosEntry('0311', 'marine_corps', 'Rifleman', ''),
+            MosEntry('IT', 'navy', 'Information Systems Technician', ''),
+            MosEntry('3D0X2', 'air_force', 'Cyber Systems Operations', ''),
+        ]))
+
+    def assertMatch(self, code, expected, method):
+        found = self.index.match_code(code, None)
+        self.assertIsNotNone(found)
+        self.assertEqual((found.entry.code, found.method), (expected, method))
+
+    def test_exact(self):
+        found = self.index.match_code('11B', None)
+        self.assertEqual((found.entry.code, found.confidence), ('11B', 1.0))
+
+    def test_normalized(self):
+        self.assertMatch('11 b', '11B', 'code')
+
+    def test_repaired(self):
+        self.assertMatch('IIB', '11B', 'repaired')
+        self.assertMatch('O311', '0311', 'repaired')
+
+    def test_skill_level(self):
+        self.assertMatch('3D032', '3D0X2', 'skill_level')
+
+    def test_prefix(self):
+        self.assertMatch('11B10', '11B', 'prefix')
+        self.assertMatch('IT2', 'IT', 'prefix')
+
+    def test_title_and_code_agree(self):
+        found = self.index.match(code='25B', title='Information Technology Specialist')
+        self.assertEqual(found.confidence, 1.0)
+
+    def test_branch_scope(self):
+        found = self.index.match(title='Rifleman', branch='army')
+        self.assertTrue(found is None or found.entry.branch == 'army')
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        doc = {'_id': ObjectId(), 'updated_at': datetime(2025, 3, 1, 12, 30, 5, 123000)}
+        self.assertEqual(decode_cursor(encode_cursor(doc, 'updated_at')), (doc['updated_at'], doc['_id']))
+
+    def test_invalid(self):
+        for cursor in (123, None, ['x'], 'not base64!', 'W10=', 'eyJ0IjogIngifQ=='):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+def turn(index, message='x' * 36):
+    return {'index': index, 'role': 'user' if index % 2 == 0 else 'bot', 'message': message}
+
+
+class PromptBudgetTests(SimpleTestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens(None), 0)
+        self.assertEqual(estimate_tokens('abcd'), 1)
+        self.assertEqual(estimate_tokens('abcde'), 2)
+
+    def test_truncate_keeps_short_text(self):
+        self.assertEqual(truncate_to_tokens('short text', 10), 'short text')
+
+    def test_truncate_cuts_on_a_word_boundary(self):
+        cut = truncate_to_tokens('word ' * 50, 10)
+        self.assertTrue(cut.endswith('word …'))
+        self.assertLessEqual(estimate_tokens(cut), 10)
+
+    def test_fit_history_keeps_newest_within_budget(self):
+        # Each formatted turn ("User: " + 36 chars + newline) costs 11 tokens
+        history = [turn(index) for index in range(5)]
+        window, overflow = fit_history(history, 33, 10, 100)
+        self.assertEqual([msg['index'] for msg in window], [2, 3, 4])
+        self.assertEqual([msg['index'] for msg in overflow], [0, 1])
+
+    def test_fit_history_message_cap(self):
+        window, overflow = fit_history([turn(index) for index in range(5)], 1000, 2, 100)
+        self.assertEqual(([msg['index'] for msg in window], len(overflow)), ([3, 4], 3))
+
+    def test_fit_history_truncates_long_messages(self):
+        window, _ = fit_history([turn(0, 'word ' * 400)], 1000, 10, 20)
+        self.assertLessEqual(estimate_tokens(window[0]['message']), 20)
+
+
+@override_settings(CHAT_SUMMARY_BATCH=3)
+class SummaryRefreshTests(SimpleTestCase):
+    def refresh(self, summary_state, overflow):
+        consumer = ChatConsumer()
+        consumer._summary_task = None
+
+        async def run():
+            with mock.patch.object(consumer, 'update_summary', new=mock.AsyncMock()) as update:
+                consumer.refresh_summary(summary_state, overflow)
+                if consumer._summary_task:
+                    await consumer._summary_task
+                return update
+
+        update = asyncio.run(run())
+        return [[msg['index'] for msg in call.args[0]] for call in update.call_args_list]
+
+    def test_any_unsummarized_overflow_is_summarized(self):
+        self.assertEqual(self.refresh({'summarized_through': 4}, [turn(index) for index in range(5)]), [[4]])
+
+    def test_oldest_turns_first_at_most_one_batch(self):
+        self.assertEqual(self.refresh({'summarized_through': 2}, [turn(index) for index in range(2, 9)]), [[2, 3, 4]])
+
+    def test_nothing_to_do(self):
+        self.assertEqual(self.refresh({'summarized_through': 5}, [turn(index) for index in range(5)]), [])
+        # Unknown state (the summary read failed)
+        self.assertEqual(self.refresh({}, [turn(0)]), [])
+
+
+class SearchTermTests(SimpleTestCase):
+    def test_normalize_terms(self):
+        self.assertEqual(
+            search_index.normalize_terms("How do I use my GI Bill? The GI bill’s rules, a 2nd time"),
+            ['use', 'gi', 'bill', "bill's", 'rules', '2nd', 'time'],
+        )
+        self.assertEqual(search_index.normalize_terms(None), [])
+
+    def test_message_text_of_bot_replies(self):
+        reply = '[{"message": "Try the VA site.", "actions": [{"label": "VA", "url": "https://va.gov"}]}]'
+        self.assertEqual(search_index.message_text(reply), "Try the VA site.")
+        self.assertEqual(search_index.message_text({"message": "saved"}), "saved")
+
+    def test_message_text_of_plain_text(self):
+        self.assertEqual(search_index.message_text("what about [brackets]"), "what about [brackets]")
+        self.assertEqual(search_index.message_text("[not json"), "[not json")
+        self.assertEqual(search_index.message_text(None), "")
+
+
+class FakeTokens:
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return iter(self.docs)
+
+
+class SearchPageTests(SimpleTestCase):
+    def hit(self, source, ref, minute):
+        return {'_id': {'source': source, 'ref': ref}, 'hits': 1, 'created_at': datetime(2025, 3, 1, 12, minute)}
+
+    def test_next_cursor_points_at_last_hit_of_the_page(self):
+        bookmark = ObjectId()
+        db = mock.Mock(search_tokens=FakeTokens([
+            self.hit('chat', 7, 3), self.hit('bookmark', bookmark, 2), self.hit('chat', 1, 1),
+        ]))
+        refs, cursor = search_index.search_refs(db, 'user', 'gi bill', limit=2)
+        self.assertEqual(refs, [('chat', 7), ('bookmark', bookmark)])
+        self.assertEqual(search_index.decode_cursor(cursor), (datetime(2025, 3, 1, 12, 2), 'bookmark', bookmark))
+        self.assertEqual(db.search_tokens.pipelines[0][-1], {'$limit': 3})
+
+        search_index.search_refs(db, 'user', 'gi bill', limit=2, cursor=cursor)
+        keyset = db.search_tokens.pipelines[1][3]['$match']['$or']
+        self.assertEqual(keyset[2], {'created_at': datetime(2025, 3, 1, 12, 2), '_id.source': 'bookmark', '_id.ref': {'$lt': bookmark}})
+
+    def test_last_page_has_no_cursor(self):
+        db = mock.Mock(search_tokens=FakeTokens([self.hit('chat', 7, 3)]))
+        self.assertEqual(search_index.search_refs(db, 'user', 'gi bill', limit=2), ([('chat', 7)], None))
+
+    def test_invalid_cursor(self):
+        for cursor in (123, 'not base64!', search_index.encode_cursor(datetime(2025, 1, 1), 'email', 1)):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                search_index.search_refs(mock.Mock(), 'user', 'gi bill', cursor=cursor)
+
+
+CROSSWALK_SOURCE = {
+    'version': 1,
+    'mos': {
+        '11B': {'titles': ['Security Officer', 'Police Officer'], 'skills': ['Team Leadership']},
+        '92Y': {'titles': ['Supply Clerk'], 'skills': ['Inventory Control']},
+        '3D0X2': {'titles': ['Systems Administrator'], 'skills': []},
+    },
+    'pay_grades': [{'grades': 'E5-E6', 'keywords': ['Team Leadership', 'Supervisor']}],
+    'terms': {'combat lifesaver': ['First Aid']},
+}
+
+
+class ProfileKeywordTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.crosswalk = crosswalk.Crosswalk(crosswalk.compile_source(json.dumps(CROSSWALK_SOURCE).encode()))
+
+    def keywords(self, profile, limit=10):
+        with mock.patch.object(crosswalk, 'get_crosswalk', return_value=self.crosswalk):
+            return crosswalk.profile_keywords(profile, limit)
+
+    def test_latest_mos_first_and_sources_add_up(self):
+        keywords = self.keywords({
+            'mos_history': [
+                {'code': '92Y', 'end_date': '2015-01-01'},
+                {'code': '11B10', 'end_date': '2020-01-01'},
+            ],
+            'pay_grade': 'E-5',
+            'training_courses': [{'name': 'Combat Lifesaver Course'}],
+        })
+        self.assertEqual(keywords[:3], ['Team Leadership', 'Security Officer', 'Police Officer'])
+        self.assertGreater(keywords.index('Supply Clerk'), keywords.index('Police Officer'))
+        self.assertIn('First Aid', keywords)
+
+    def test_afsc_skill_level(self):
+        self.assertEqual(self.keywords({'mos_history': [{'code': '3D032'}]}), ['Systems Administrator'])
+
+    def test_limit_and_empty_profile(self):
+        self.assertEqual(len(self.keywords({'mos_history': [{'code': '11B'}]}, limit=2)), 2)
+        self.assertEqual(self.keywords({'mos_history': [{'code': 'ZZZ'}], 'skills': 'not a list'}), [])
+
+
+class CacheUpsertTests(SimpleTestCase):
+    def test_one_insert_only_upsert_per_key(self):
+        scraped = datetime(2025, 3, 1, 12, 0)
+        items = [
+            {'url': 'https://a.example', 'title': 'A', '_id': 'stale'},
+            {'url': 'https://b.example', 'title': 'B'},
+            {'url': 'https://a.example', 'title': 'A again'},
+            {'title': 'no url'},
+        ]
+        with mock.patch.object(cache_writer, 'datetime', mock.Mock(utcnow=mock.Mock(return_value=scraped))):
+            requests = cache_writer.build_upserts(items, 'url', 'fp')
+        self.assertEqual(requests, [
+            UpdateOne(
+                {'url': 'https://a.example', 'fingerprint': 'fp'},
+                {'$setOnInsert': {'url': 'https://a.example', 'title': 'A', 'fingerprint': 'fp',
+                                  'scraped_at': scraped.isoformat()}},
+                upsert=True,
+            ),
+            UpdateOne(
+                {'url': 'https://b.example', 'fingerprint': 'fp'},
+                {'$setOnInsert': {'url': 'https://b.example', 'title': 'B', 'fingerprint': 'fp',
+                                  'scraped_at': scraped.isoformat()}},
+                upsert=True,
+            ),
+        ])
+
+    def test_no_keys_no_requests(self):
+        self.assertEqual(cache_writer.build_upserts([{'title': 'no url'}], 'url', 'fp'), [])
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_capacity_bound(self):
+        cache = LRUCache(3)
+        for i in range(10):
+            cache.set(i, i, 60)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual([cache.get(i) for i in (6, 7, 8, 9)], [None, 7, 8, 9])
+
+    def test_overwrite_refreshes_recency(self):
+        cache = LRUCache(2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.set('a', 10, 60)
+        cache.set('c', 3, 60)
+        self.assertEqual((cache.get('a'), cache.get('b')), (10, None))
+
+    def test_expired_entries_are_dropped(self):
+        cache = LRUCache(2)
+        cache.set('a', 1, -1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
@@ -4,6 +4,7 @@ from . import api
 urlpatterns = [
     path("chat/", api.chatbot_view, name="chat-ui"),
     path("chats/all", api.FetchChats.as_view()),
+    path("chats/search", api.SearchChats.as_view()),
     path("jobs/search", api.VeteranJobSearchView.as_view(), name="jobs-search"),
     path("jobs/all", api.FetchRelJobs.as_view(), name="jobs-fetch"),
     path("chat/bookmark", api.BookmarkMessage.as_view()),
@@ -14,4 +15,5 @@ urlpatterns = [
     path("events/all", api.FetchRelEvents.as_view(), name="events-fetch"),
     path("bio/generate", api.VeteranBioDataView.as_view(), name="bio-fetch"),
     path("bio/download", api.VeteranBioPDFView.as_view(), name="bio-download"),
+    path("health/mongo", api.MongoHealthView.as_view(), name="mongo-health"),
 ]
\ No newline at end of file
@@ -11,6 +11,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,9 +32,9 @@ ALLOWED_HOSTS = ["*"]
 CORS_ALLOW_ALL_ORIGINS = True
 
 SCHEMA_PATHS = {
-    'DD214': 'schemas/dd214.schema.json',
-    'JST': 'schemas/jst.schema.json',
-    'DD2586': 'schemas/dd2586.schema.json',
+    'DD214': BASE_DIR / 'schemas' / 'dd214.schema.json',
+    'JST': BASE_DIR / 'schemas' / 'jst.schema.json',
+    'DD2586': BASE_DIR / 'schemas' / 'dd2586.schema.json',
 }
 
 import os
@@ -40,10 +42,155 @@ load_dotenv()
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
 MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'veteran_docs')
+
+# Document text extraction (users/extraction.py): pages are spread over a process
+# pool; pages with less text than DOCUMENT_OCR_MIN_PAGE_CHARS are OCR'd instead
+DOCUMENT_EXTRACTION_WORKERS = int(os.getenv('DOCUMENT_EXTRACTION_WORKERS', os.cpu_count() or 2))
+DOCUMENT_EXTRACTION_START_METHOD = 'spawn'
+DOCUMENT_OCR_MIN_PAGE_CHARS = 20
+DOCUMENT_OCR_DPI = 300
+DOCUMENT_OCR_LANG = 'eng'
+# Characters of document text sent to the LLM; extraction stops once it has them.
+# Pages listed per document type are read first (negative = from the end).
+DOCUMENT_TEXT_BUDGET = 10000
+DOCUMENT_PAGE_PRIORITY = {
+    'DD214': [0],
+    'DD2586': [0],
+    'JST': [0, 1],
+}
+# Longer documents of these types are read up to the given number of characters and
+# extracted in DOCUMENT_TEXT_BUDGET-sized chunks, DOCUMENT_CHUNK_CONCURRENCY LLM calls at a time
+DOCUMENT_CHUNKED_TEXT_LIMITS = {
+    'JST': 60000,
+}
+DOCUMENT_CHUNK_CONCURRENCY = int(os.getenv('DOCUMENT_CHUNK_CONCURRENCY', 6))
+# DD214/DD2586 boxes read by the layout templates (users/layouts.py) at or above
+# this confidence are used as-is; only the remaining fields are sent to the LLM
+DOCUMENT_TEMPLATE_MIN_CONFIDENCE = float(os.getenv('DOCUMENT_TEMPLATE_MIN_CONFIDENCE', 0.8))
+# Validate extracted form_data against the compiled document schema (users/schemas.py)
+DOCUMENT_SCHEMA_VALIDATION = os.getenv('DOCUMENT_SCHEMA_VALIDATION', '0') == '1'
+
+# Shared Mongo clients (app/mongo.py): pool sizing, timeouts in ms, read preference
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+MONGO_MAX_IDLE_TIME_MS = 60000
+MONGO_CONNECT_TIMEOUT_MS = 5000
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+MONGO_SOCKET_TIMEOUT_MS = 30000
+MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+# Create missing declared indexes (app/mongo_indexes.py) in the background at startup.
+# Off by default: ready() runs for every manage.py command and test run too; deploys
+# run `manage.py ensure_indexes` instead.
+MONGO_ENSURE_INDEXES_ON_STARTUP = os.getenv('MONGO_ENSURE_INDEXES_ON_STARTUP', '0') == '1'
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_MODEL = os.getenv('GROQ_MODEL', 'meta-llama/llama-4-scout-17b-16e-instruct')
 SERPAPI_KEY = os.getenv('SERPAPI_KEY')
 
+# LLM gateway (app/llm.py): pooled HTTP/2 connections and per-task timeouts in seconds
+LLM_HTTP2 = True
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 20))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', 10))
+LLM_KEEPALIVE_EXPIRY = 60
+LLM_CONNECT_TIMEOUT = 10
+LLM_TIMEOUTS = {
+    'default': 60,
+    'chat': 60,
+    'keywords': 60,
+    'extract': 60,
+    'score': 30,
+    'bio': 60,
+    'document': 120,
+    'profile_summary': 60,
+    'summary': 30,
+}
+
+# Chat: default for the per-message "stream" flag sent by the websocket client
+CHAT_STREAM_DEFAULT = os.getenv('CHAT_STREAM_DEFAULT', '0') == '1'
+
+# Chat: per-source timeouts (seconds) when gathering context for a turn
+CHAT_CONTEXT_TIMEOUTS = {
+    'history': 3,
+    'profile': 3,
+    'web_search': 8,
+}
+
+# Chat prompt budgets in estimated tokens per section (app/prompt_budget.py).
+# History beyond the window is folded into a rolling summary after each turn,
+# at most CHAT_SUMMARY_BATCH messages per update.
+CHAT_PROMPT_BUDGET = {
+    'profile': 800,
+    'summary': 300,
+    'history': 1500,
+    'message': 300,
+    'knowledge_base': 800,
+    'question': 400,
+}
+CHAT_HISTORY_WINDOW = 20
+CHAT_SUMMARY_BATCH = 6
+
+# Cursor pagination for /chats/all and /chat/bookmark/all (app/pagination.py)
+PAGINATION_DEFAULT_LIMIT = 20
+PAGINATION_MAX_LIMIT = 100
+
+# Messages per chat_buckets document (app/chat_store.py)
+CHAT_BUCKET_SIZE = 50
+
+# Job search pipeline (app/pipeline.py): max in-flight jobs per stage
+JOB_SEARCH_CONCURRENCY = {
+    'crawl': 5,
+    'extract': 4,
+    'score': 4,
+}
+JOB_SEARCH_CRAWL_TIMEOUT = 10
+
+# MOS registry (app/mos_registry.py): seed file for an empty mos_doc collection,
+# per-branch *_mos.json files, and how often (seconds) to check the version stamp
+MOS_DATABASE_PATH = BASE_DIR / 'app' / 'utils' / 'data' / 'mos_database.json'
+MOS_DATA_DIR = BASE_DIR / 'users' / 'mos_data'
+MOS_REGISTRY_CHECK_INTERVAL = 300
+# Fuzzy MOS matches (app/mos_match.py) below this confidence are ignored
+MOS_MATCH_MIN_CONFIDENCE = 0.6
+
+# MOS -> civilian keyword crosswalk (app/crosswalk.py). Searches only ask the
+# LLM for keywords when the crosswalk yields fewer than MOS_CROSSWALK_MIN_KEYWORDS.
+MOS_CROSSWALK_SOURCE_PATH = BASE_DIR / 'app' / 'utils' / 'data' / 'mos_crosswalk.json'
+MOS_CROSSWALK_INDEX_PATH = BASE_DIR / 'app' / 'utils' / 'data' / 'mos_crosswalk.index.json'
+MOS_CROSSWALK_MIN_KEYWORDS = 3
+MOS_CROSSWALK_MAX_KEYWORDS = 10
+
+# Search result caches (app/cache_writer.py): write after the response is sent
+SEARCH_CACHE_WRITE_BACKGROUND = True
+SEARCH_CACHE_WRITE_WORKERS = 2
+
+# LLM response cache (app/llm_cache.py): in-process LRU per task in front of a
+# Mongo collection with a TTL index. Tasks not listed here are never cached.
+LLM_CACHE = {
+    'enabled': os.getenv('LLM_CACHE_ENABLED', '1') == '1',
+    'collection': 'llm_cache',
+    'tasks': {
+        'keywords': {'ttl': 24 * 3600, 'max_entries': 512},
+        'extract': {'ttl': 7 * 24 * 3600, 'max_entries': 2048},
+        'score': {'ttl': 24 * 3600, 'max_entries': 2048},
+        'profile_summary': {'ttl': 24 * 3600, 'max_entries': 256},
+    },
+}
+
+# Secret for keyed digests over encrypted data (bookmark dedupe, search tokens).
+# Changing it invalidates every stored digest and search token, so outside DEBUG it
+# must come from the environment rather than follow SECRET_KEY.
+BLIND_INDEX_KEY = os.getenv('BLIND_INDEX_KEY')
+if not BLIND_INDEX_KEY:
+    if not DEBUG:
+        raise ImproperlyConfigured("BLIND_INDEX_KEY must be set when DEBUG is off.")
+    BLIND_INDEX_KEY = SECRET_KEY
+# Distinct terms indexed per message for chat/bookmark search
+SEARCH_MAX_TERMS = 64
+
+# Store user_data and chat messages as one sealed ciphertext per document
+# (users/crypt.py). Readers understand both this and the per-field format.
+SEALED_DOCUMENTS = os.getenv('SEALED_DOCUMENTS', '1') == '1'
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -3,13 +3,13 @@ from rest_framework.response import Response
 from rest_framework import status, views, generics, permissions
 from .serializers import RegisterSerializer, LoginSerializer
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
 from .llama_utils import *
-import pdfplumber
-from PIL import Image
-import pytesseract
 import io
 from .models import User
-from .crypt import encrypt_with_fingerprint
+from .crypt import encrypt_with_fingerprint, seal_with_fingerprint
+from . import chunking, extraction, layouts, schemas
+from app import llm, mongo, prompts
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
@@ -38,42 +38,36 @@ class LogoutView(views.APIView):
         except Exception:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
+# Schema fields that are never read off the page (set by the app or generated later)
+TEMPLATE_SKIPPED_FIELDS = {'document_type', 'uploaded_at', 'profile_summary'}
+
+
 class DocumentUploadView(views.APIView):
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [permissions.IsAuthenticated]
 
-    def extract_file(self, file_obj):
-        file_name = file_obj.name
-        file_text = ""
-
-        if file_name.endswith(".pdf"):
-            with pdfplumber.open(file_obj) as pdf:
-                file_text = "\n".join([page.extract_text() or "" for page in pdf.pages])
-        elif file_name.endswith(('.jpg', '.jpeg', '.png')):
-            image = Image.open(file_obj)
-            file_text = pytesseract.image_to_string(image)
-        else:
-            raise ValueError("Unsupported file type. Only PDF and image files are supported.")
-
-        if not file_text.strip():
-            raise ValueError("Failed to extract text from file.")
+    def read_template(self, file_obj, document_type):
+        # Best effort: any failure just leaves every field to the LLM
+        try:
+            return layouts.extract_fields(file_obj, document_type)
+        except Exception as e:
+            print(f"[layouts] Template read failed for {document_type}: {e}")
+            file_obj.seek(0)
+            return layouts.EMPTY_RESULT
 
-        return file_text
+    def extract_file(self, file_obj, document_type=None, known=None):
+        # Only as much text as the prompt(s) can use is ever extracted; long document
+        # types are read further and extracted in chunks
+        budget = settings.DOCUMENT_CHUNKED_TEXT_LIMITS.get(document_type, settings.DOCUMENT_TEXT_BUDGET)
+        return extraction.extract_pages(file_obj, document_type, budget=budget, known=known)
 
     def post(self, request, format=None):
         user = request.user
         file_obj = request.FILES.get('file_obj')
-        try:
-            extracted_text = self.extract_file(file_obj)
-        except ValueError as ve:
-            return Response({'error': str(ve)}, status=400)
-        except Exception as e:
-            print(e)
-            return Response({'error': f'Text extraction failed: {str(e)}'}, status=500)
-
-        document_type = request.data.get('document_type').upper()
+        document_type = (request.data.get('document_type') or '').upper()
         ALLOWED_DOC_TYPES = ['DD214', 'JST', 'DD2586']
 
+        # Validate before extracting: extraction is the expensive part
         if not file_obj or not document_type:
             return Response({'error': 'Missing required fields.'}, status=status.HTTP_400_BAD_REQUEST)
         if document_type not in ALLOWED_DOC_TYPES:
@@ -83,64 +77,84 @@ class DocumentUploadView(views.APIView):
 
         file_name = file_obj.name
 
-        # Load the document schema
-        schema_path = settings.SCHEMA_PATHS[document_type]
+        # Compiled once per process (users/schemas.py)
         try:
-            with open(schema_path, 'r') as f:
-                form_schema = json.load(f)
+            document_schema = schemas.get(document_type)
         except Exception as e:
             return Response({'error': f'Failed to load schema: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Build LLM prompt
-        prompt = (
-            f"You are an expert in extracting structured data from U.S. military documents.\n"
-            f"The user has uploaded a {document_type} file named '{file_name}'.\n"
-            f"Using the extracted text below,:\n\n"
-            f"`form_data`: Match the structure defined by this JSON schema:\n{json.dumps(form_schema, indent=2)}\n\n"
-            f"Respond ONLY with a valid JSON object, wrapped between special tokens:\n"
-            f"Start your output with `[[[JSON]]]` and end it with `[[[/JSON]]]`.\n"
-            f"Do not include any explanations or text outside the tokens.\n"
-            f"The expected structure is:\n"
-            f"[[[JSON]]]\n{{\n  \"form_data\": {{ ... }}}}\n[[[/JSON]]]\n\n"
-            f"----- BEGIN EXTRACTED TEXT -----\n{extracted_text[:10000]}\n----- END EXTRACTED TEXT -----"
-        )
-
-
-
-        # Prepare payload for Groq API
-        data = {
-            "model": "meta-llama/llama-4-scout-17b-16e-instruct",
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant that extracts structured data from military documents and infers user profile data."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 2048
+        # Fixed forms: read the boxes the layout template can, ask the LLM for the rest only
+        template = self.read_template(file_obj, document_type)
+        min_confidence = settings.DOCUMENT_TEMPLATE_MIN_CONFIDENCE
+        template_fields = {
+            field: value for field, value in template.fields.items()
+            if template.confidence.get(field, 0.0) >= min_confidence
         }
-        headers = {
-            'Authorization': f'Bearer {settings.GROQ_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-
-        try:
-            llama_response = requests.post(settings.GROQ_API_URL, json=data, headers=headers)
-            llama_response.raise_for_status()
-            result = llama_response.json()
-            content = result["choices"][0]["message"]["content"]
+        missing = [
+            field for field in document_schema.schema.get('properties', {})
+            if field not in template_fields and field not in TEMPLATE_SKIPPED_FIELDS
+        ]
+
+        form_data = {}
+        llm_fields = []
+        chunks = 0
+        if missing:
             try:
-                extracted_data = json.loads(content)
-                extracted_data["fingerprint"] = user.fingerprint
-            except json.JSONDecodeError:
-                import re
-                match = re.search(r'\[\[\[JSON\]\]\](.*?)\[\[\[/JSON\]\]\]', content, re.DOTALL)
-                if not match:
-                    raise ValueError("Special JSON markers not found in LLaMA response.")
+                # Page 1 was already read (text layer or OCR) by the template
+                known = {0: template.page_text} if template.page_text is not None else None
+                pages = self.extract_file(file_obj, document_type, known)
+            except ValueError as ve:
+                return Response({'error': str(ve)}, status=400)
+            except Exception as e:
+                print(e)
+                return Response({'error': f'Text extraction failed: {str(e)}'}, status=500)
+
+            prompt_schema = document_schema.prompt
+            if template_fields:
+                prompt_schema = schemas.partial_prompt(document_type, frozenset(template_fields))
 
-                extracted_data = json.loads(match.group(1).strip())
-                extracted_data["fingerprint"] = user.fingerprint
+            try:
+                extracted_text = "\n".join(pages)
+                if len(extracted_text) > settings.DOCUMENT_TEXT_BUDGET:
+                    form_data, chunks, failed = chunking.extract_chunked(
+                        document_type, file_name, document_schema.schema, prompt_schema, pages
+                    )
+                    if failed:
+                        print(f"[chunking] {failed} of {chunks} parts of {file_name} failed to extract")
+                else:
+                    # Build LLM prompt
+                    messages = prompts.DOCUMENT_EXTRACT.messages(
+                        document_type=document_type,
+                        schema=prompt_schema,
+                        file_name=file_name,
+                        text=extracted_text,
+                    )
+                    content = llm.chat_completion(messages, task='document', max_tokens=2048)
+                    form_data = chunking.parse_form_data(content)
+                    chunks = 1
+                llm_fields = missing
 
+            except Exception as e:
+                return Response({'error': f'LLama extraction failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # Template values were read straight off the form; they win over the LLM's
+        form_data.update(template_fields)
+        form_data.setdefault('document_type', document_type)
+        extracted_data = {
+            'form_data': form_data,
+            'extraction': {
+                'template_fields': {field: template.confidence[field] for field in template_fields},
+                'llm_fields': llm_fields,
+                'chunks': chunks,
+            },
+            'fingerprint': user.fingerprint,
+        }
 
-        except Exception as e:
-            return Response({'error': f'LLama extraction failed: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        if settings.DOCUMENT_SCHEMA_VALIDATION:
+            # profile_summary and user_id are only added later, so required fields are not enforced here
+            validation_errors = schemas.errors(document_type, form_data, partial=True)
+            if validation_errors:
+                return Response({'error': f'Schema validation failed: {validation_errors[0]}'}, status=status.HTTP_400_BAD_REQUEST)
 
         # # Enrich and validate form_data
         # form_data = extracted_data
@@ -148,10 +162,6 @@ class DocumentUploadView(views.APIView):
         # profile_summary = generate_profile_summary(form_data)
         # form_data['profile_summary'] = profile_summary
 
-        # try:
-        #     validate(instance=form_data, schema=form_schema)
-        # except ValidationError as ve:
-        #     return Response({'error': f'Schema validation failed: {ve.message}'}, status=status.HTTP_400_BAD_REQUEST)
 
         # # Insert to MongoDB
         # try:
@@ -178,11 +188,12 @@ class UpdateUserData(views.APIView):
         user.save()
         if form_data:
             try:
-                encrypted_form_data = encrypt_with_fingerprint(form_data, user.fingerprint)
+                if settings.SEALED_DOCUMENTS:
+                    encrypted_form_data = seal_with_fingerprint(form_data, user.fingerprint)
+                else:
+                    encrypted_form_data = encrypt_with_fingerprint(form_data, user.fingerprint)
                 encrypted_form_data["fingerprint"] = user.fingerprint
-                client = MongoClient(settings.MONGO_URI)
-                db = client['veteran_docs']
-                db["user_data"].insert_one(encrypted_form_data)
+                mongo.get_db()["user_data"].insert_one(encrypted_form_data)
             except Exception as e:
                 return Response({"error": f"Failed to save form data: {str(e)}"}, status=500)
 
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from . import schemas
+
+        # Fail at startup on a missing or invalid schema rather than on the first upload
+        schemas.load()
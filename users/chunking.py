@@ -0,0 +1,199 @@
+import json
+import re
+
+from django.conf import settings
+
+from app import llm, prompts
+from app.pipeline import Stage, run_pipeline
+
+# Map-reduce extraction for documents longer than one prompt's text budget
+# (mostly JSTs, which run to many pages of courses and experience). The pages
+# are packed into chunks of at most DOCUMENT_TEXT_BUDGET characters, breaking
+# on page boundaries first and on section headings inside oversized pages.
+# Every chunk is extracted by its own LLM call, DOCUMENT_CHUNK_CONCURRENCY at
+# a time, and the per-chunk form_data are merged by schema: arrays are
+# concatenated and deduplicated, scalars keep the first non-empty value in
+# document order.
+
+# A heading line: capitals only (no lowercase), a few words, no sentence punctuation
+_HEADING_RE = re.compile(r'^[A-Z0-9][A-Z0-9 &/()\-,:]{3,60}$')
+_IDENTITY_JUNK_RE = re.compile(r'[^a-z0-9]+')
+_JSON_MARKERS_RE = re.compile(r'\[\[\[JSON\]\]\](.*?)\[\[\[/JSON\]\]\]', re.DOTALL)
+
+# Provenance is not part of an entry's identity
+IDENTITY_IGNORED_KEYS = ('source',)
+
+
+def parse_form_data(content):
+    """
+    Parses an extraction reply: plain JSON or JSON between [[[JSON]]] markers.
+    Returns the form_data object; raises ValueError when it is not an object.
+    """
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        match = _JSON_MARKERS_RE.search(content)
+        if not match:
+            raise ValueError("Special JSON markers not found in LLaMA response.")
+        data = json.loads(match.group(1).strip())
+    form_data = data.get('form_data', data) if isinstance(data, dict) else data
+    if not isinstance(form_data, dict):
+        raise ValueError("Extraction reply is not a JSON object.")
+    return form_data
+
+
+def _is_heading(line):
+    line = line.strip()
+    return bool(_HEADING_RE.match(line)) and len(line.split()) >= 2
+
+
+def split_sections(text):
+    """
+    Splits page text before each heading line. Returns non-empty sections.
+    """
+    sections = []
+    current = []
+    for line in text.splitlines():
+        if _is_heading(line) and any(existing.strip() for existing in current):
+            sections.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current))
+    return [section for section in sections if section.strip()]
+
+
+def _split_lines(text, size):
+    pieces = []
+    current = ''
+    for line in text.splitlines():
+        while len(line) > size:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:size])
+            line = line[size:]
+        if current and len(current) + len(line) + 1 > size:
+            pieces.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_pages(pages, size):
+    """
+    Packs page texts into chunks of at most `size` characters. Whole pages are
+    kept together when they fit; larger pages are split into sections, and
+    sections still too large into runs of lines.
+    """
+    units = []
+    for page in pages:
+        if len(page) <= size:
+            units.append(page)
+            continue
+        for section in split_sections(page):
+            units.extend([section] if len(section) <= size else _split_lines(section, size))
+
+    chunks = []
+    current = ''
+    for unit in units:
+        if not unit.strip():
+            continue
+        if current and len(current) + len(unit) + 1 > size:
+            chunks.append(current)
+            current = unit
+        else:
+            current = f"{current}\n{unit}" if current else unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _is_empty(value):
+    return value is None or value == '' or value == [] or value == {}
+
+
+def _identity(item, item_schema):
+    """
+    Dedupe key of an array entry: its required fields (all fields when none are
+    required), compared case- and punctuation-insensitively.
+    """
+    if not isinstance(item, dict):
+        return _IDENTITY_JUNK_RE.sub(' ', json.dumps(item).lower()).strip()
+    keys = [key for key in item_schema.get('required') or sorted(item) if key not in IDENTITY_IGNORED_KEYS]
+    return tuple(_IDENTITY_JUNK_RE.sub(' ', str(item.get(key) or '').lower()).strip() for key in keys)
+
+
+def merge_values(schema, values):
+    """
+    Merges the values one field took in each chunk, in chunk order.
+    """
+    values = [value for value in values if not _is_empty(value)]
+    if not values:
+        return None
+    kind = schema.get('type')
+    if kind == 'array' and all(isinstance(value, list) for value in values):
+        item_schema = schema.get('items') or {}
+        merged = {}
+        for item in (item for value in values for item in value):
+            key = _identity(item, item_schema)
+            if key in merged and isinstance(item, dict):
+                # The same entry seen in two chunks: fill in what the first one lacked
+                merged[key] = merge_objects(item_schema, [merged[key], item])
+            else:
+                merged.setdefault(key, item)
+        return list(merged.values())
+    if kind == 'object' and all(isinstance(value, dict) for value in values):
+        return merge_objects(schema, values)
+    return values[0]
+
+
+def merge_objects(schema, objects):
+    properties = schema.get('properties') or {}
+    merged = {}
+    for field in dict.fromkeys(field for obj in objects for field in obj):
+        value = merge_values(properties.get(field, {}), [obj.get(field) for obj in objects])
+        if value is not None:
+            merged[field] = value
+    return merged
+
+
+def merge_form_data(schema, parts):
+    """
+    Reduces the per-chunk form_data into one, following the document schema.
+    """
+    return merge_objects(schema, [part for part in parts if isinstance(part, dict)])
+
+
+async def _extract_chunks(document_type, file_name, schema_prompt, chunks):
+    async def extract(indexed):
+        part, text = indexed
+        messages = prompts.DOCUMENT_EXTRACT_PART.messages(
+            document_type=document_type,
+            schema=schema_prompt,
+            file_name=file_name,
+            part=part,
+            parts=len(chunks),
+            text=text,
+        )
+        content = await llm.achat_completion(messages, task='document', max_tokens=2048)
+        return parse_form_data(content)
+
+    stage = Stage('extract_chunk', extract, settings.DOCUMENT_CHUNK_CONCURRENCY)
+    return await run_pipeline(list(enumerate(chunks, start=1)), [stage])
+
+
+def extract_chunked(document_type, file_name, schema, schema_prompt, pages):
+    """
+    Extracts form_data from a long document chunk by chunk and merges the
+    results. Returns (form_data, chunk count, failed chunk count). Chunks that
+    fail are left out; raises ValueError when all of them do.
+    """
+    chunks = chunk_pages(pages, settings.DOCUMENT_TEXT_BUDGET)
+    parts = llm.run_sync(_extract_chunks(document_type, file_name, schema_prompt, chunks))
+    if not parts:
+        raise ValueError("Extraction failed for every part of the document.")
+    return merge_form_data(schema, parts), len(chunks), len(chunks) - len(parts)
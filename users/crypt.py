@@ -1,20 +1,60 @@
 from cryptography.fernet import Fernet
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from functools import lru_cache
 import base64
 import hashlib
+import hmac
+import json
+import threading
+import zlib
 
+# Derived keys kept per process; one entry per active user fingerprint.
+FERNET_CACHE_SIZE = 1024
+# Batches smaller than this are not worth handing to the thread pool.
+PARALLEL_MIN_ITEMS = 200
+PARALLEL_CHUNK_SIZE = 100
+
+# Sealed documents keep the whole body in one ciphertext under this key.
+# The first plaintext byte tells how the JSON body was packed.
+SEALED_FIELD = '_sealed'
+SEAL_RAW = b'\x01'
+SEAL_ZLIB = b'\x02'
+SEAL_MIN_COMPRESS = 128
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+@lru_cache(maxsize=FERNET_CACHE_SIZE)
 def get_fernet_from_fingerprint(fingerprint: str) -> Fernet:
     """
-    Derives a Fernet instance from a fingerprint string.
+    Derives a Fernet instance from a fingerprint string. Cached (LRU) per fingerprint.
     """
     digest = hashlib.sha256(fingerprint.encode()).digest()  # 32 bytes
     key = base64.urlsafe_b64encode(digest)  # Fernet requires base64-encoded 32-byte key
     return Fernet(key)
 
-def encrypt_with_fingerprint(data: dict, fingerprint: str) -> dict:
+@lru_cache(maxsize=FERNET_CACHE_SIZE)
+def _digest_key(fingerprint: str) -> bytes:
+    # Per-user HMAC key: server secret + fingerprint, so digests are neither
+    # guessable from the fingerprint alone nor comparable across users.
+    return hmac.new(settings.BLIND_INDEX_KEY.encode(), fingerprint.encode(), hashlib.sha256).digest()
+
+def keyed_digest(text: str, fingerprint: str) -> str:
     """
-    Encrypts string fields in the dictionary using fingerprint-derived Fernet key.
+    Deterministic keyed HMAC-SHA256 of a plaintext, for equality lookups on encrypted data.
     """
-    fernet = get_fernet_from_fingerprint(fingerprint)
+    return hmac.new(_digest_key(fingerprint), text.encode(), hashlib.sha256).hexdigest()
+
+def message_digest(message, fingerprint: str) -> str:
+    """
+    keyed_digest of a bookmarked message; structured replies are digested as sorted-key JSON.
+    """
+    plaintext = message if isinstance(message, str) else json.dumps(message, sort_keys=True)
+    return keyed_digest(plaintext, fingerprint)
+
+def _encrypt_dict(fernet: Fernet, data: dict) -> dict:
     encrypted = {}
     for key, value in data.items():
         if isinstance(value, str) and value.strip():
@@ -23,11 +63,31 @@ def encrypt_with_fingerprint(data: dict, fingerprint: str) -> dict:
             encrypted[key] = value
     return encrypted
 
-def decrypt_with_fingerprint(data: dict, fingerprint: str) -> dict:
-    """
-    Decrypts encrypted string fields in the dictionary using fingerprint-derived Fernet key.
-    """
-    fernet = get_fernet_from_fingerprint(fingerprint)
+def _seal_dict(fernet: Fernet, data: dict, plaintext_keys) -> dict:
+    sealed = {key: data[key] for key in (*plaintext_keys, '_id') if key in data}
+    body = {key: value for key, value in data.items() if key not in sealed}
+    packed = json.dumps(body, separators=(',', ':'), default=str).encode()
+    if len(packed) >= SEAL_MIN_COMPRESS:
+        compressed = zlib.compress(packed)
+        packed = SEAL_ZLIB + compressed if len(compressed) < len(packed) else SEAL_RAW + packed
+    else:
+        packed = SEAL_RAW + packed
+    # Store the raw token bytes (BSON binary) rather than its base64 text
+    sealed[SEALED_FIELD] = base64.urlsafe_b64decode(fernet.encrypt(packed))
+    return sealed
+
+def _unseal_dict(fernet: Fernet, data: dict) -> dict:
+    packed = fernet.decrypt(base64.urlsafe_b64encode(bytes(data[SEALED_FIELD])))
+    body = packed[1:]
+    if packed[:1] == SEAL_ZLIB:
+        body = zlib.decompress(body)
+    opened = {key: value for key, value in data.items() if key != SEALED_FIELD}
+    opened.update(json.loads(body))
+    return opened
+
+def _decrypt_dict(fernet: Fernet, data: dict) -> dict:
+    if SEALED_FIELD in data:
+        return _unseal_dict(fernet, data)
     decrypted = {}
     for key, value in data.items():
         if isinstance(value, str):
@@ -38,3 +98,72 @@ def decrypt_with_fingerprint(data: dict, fingerprint: str) -> dict:
         else:
             decrypted[key] = value
     return decrypted
+
+def _encrypt_item(fernet: Fernet, item):
+    if isinstance(item, dict):
+        return _encrypt_dict(fernet, item)
+    if isinstance(item, str) and item.strip():
+        return fernet.encrypt(item.encode()).decode()
+    return item
+
+def _decrypt_item(fernet: Fernet, item):
+    if isinstance(item, dict):
+        return _decrypt_dict(fernet, item)
+    if isinstance(item, str):
+        try:
+            return fernet.decrypt(item.encode()).decode()
+        except Exception:
+            return item
+    return item
+
+def encrypt_with_fingerprint(data: dict, fingerprint: str) -> dict:
+    """
+    Encrypts string fields in the dictionary using fingerprint-derived Fernet key.
+    """
+    return _encrypt_dict(get_fernet_from_fingerprint(fingerprint), data)
+
+def seal_with_fingerprint(data: dict, fingerprint: str, plaintext_keys=('fingerprint',)) -> dict:
+    """
+    Serializes, compresses and encrypts the whole document as one blob.
+    Keys in plaintext_keys (and _id) stay readable so they can still be queried.
+    """
+    return _seal_dict(get_fernet_from_fingerprint(fingerprint), data, plaintext_keys)
+
+def decrypt_with_fingerprint(data: dict, fingerprint: str) -> dict:
+    """
+    Decrypts a document using fingerprint-derived Fernet key. Understands both sealed
+    documents and the per-field format.
+    """
+    return _decrypt_dict(get_fernet_from_fingerprint(fingerprint), data)
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='crypt')
+    return _executor
+
+def _map_batch(func, items: list, parallel: bool) -> list:
+    if not parallel or len(items) < PARALLEL_MIN_ITEMS:
+        return [func(item) for item in items]
+    chunks = [items[i:i + PARALLEL_CHUNK_SIZE] for i in range(0, len(items), PARALLEL_CHUNK_SIZE)]
+    results = []
+    for chunk in _get_executor().map(lambda chunk: [func(item) for item in chunk], chunks):
+        results.extend(chunk)
+    return results
+
+def encrypt_many(items: list, fingerprint: str, parallel: bool = False) -> list:
+    """
+    Encrypts a batch of dicts (string fields) or plain strings with one key derivation.
+    With parallel=True, large batches are split across a shared thread pool.
+    """
+    fernet = get_fernet_from_fingerprint(fingerprint)
+    return _map_batch(lambda item: _encrypt_item(fernet, item), items, parallel)
+
+def decrypt_many(items: list, fingerprint: str, parallel: bool = False) -> list:
+    """
+    Decrypts a batch of dicts or plain strings produced by encrypt_many/encrypt_with_fingerprint.
+    """
+    fernet = get_fernet_from_fingerprint(fingerprint)
+    return _map_batch(lambda item: _decrypt_item(fernet, item), items, parallel)
@@ -0,0 +1,252 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing
+from itertools import islice
+
+import pdfplumber
+import pypdfium2
+import pytesseract
+from django.conf import settings
+from PIL import Image
+
+# Text extraction for uploaded documents. PDF pages are fanned out to a
+# process pool (pdfplumber and tesseract are CPU bound and hold the GIL).
+# Pages without a usable text layer are rasterized with pypdfium2 and OCR'd.
+# Pages are streamed lazily under a character budget, most useful pages first,
+# and merged back in page order: a multi-page scan takes about as long as its
+# slowest page, and pages past the budget are never parsed. Worker functions
+# take plain arguments and never read Django settings, so they also run under
+# the 'spawn' start method.
+
+PageText = namedtuple('PageText', ['index', 'text', 'method'])
+
+PDF_EXTENSIONS = ('.pdf',)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.DOCUMENT_EXTRACTION_WORKERS,
+                    mp_context=multiprocessing.get_context(settings.DOCUMENT_EXTRACTION_START_METHOD),
+                )
+    return _executor
+
+
+def _reset_executor(broken):
+    """
+    Drops a broken pool so the next caller builds a new one. The pool is not
+    shut down here: other uploads may still hold its futures, and they fall
+    back to reading inline when those fail.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+
+
+def run_in_pool(fn, *args):
+    """
+    Runs fn(*args) in the extraction pool and returns its result, inline when
+    the pool is broken. `fn` must be a module-level function that takes plain
+    arguments (see the note above).
+    """
+    executor = _get_executor()
+    try:
+        return executor.submit(fn, *args).result()
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        return fn(*args)
+
+
+def ocr_image(image, lang):
+    return pytesseract.image_to_string(image, lang=lang)
+
+
+def extract_page(path, index, min_chars, dpi, lang):
+    """
+    Text of one PDF page: the text layer when it has at least min_chars
+    characters, otherwise OCR of the page rendered at `dpi`.
+    """
+    with pdfplumber.open(path, pages=[index + 1]) as pdf:
+        text = pdf.pages[0].extract_text() or ''
+    if len(text.strip()) >= min_chars:
+        return PageText(index, text, 'text')
+
+    try:
+        pdf = pypdfium2.PdfDocument(path)
+        try:
+            image = pdf[index].render(scale=dpi / 72).to_pil()
+        finally:
+            pdf.close()
+        ocr_text = ocr_image(image, lang)
+    except Exception as e:
+        # Missing tesseract or an unreadable page: the sparse text layer is better than no upload
+        print(f"[extraction] OCR failed on page {index + 1}, keeping the text layer: {e}")
+        return PageText(index, text, 'text')
+    # Keep whichever reading has more to offer (e.g. a sparse but real text layer)
+    if len(ocr_text.strip()) > len(text.strip()):
+        return PageText(index, ocr_text, 'ocr')
+    return PageText(index, text, 'text')
+
+
+def page_count(path):
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def _page_args():
+    return (
+        settings.DOCUMENT_OCR_MIN_PAGE_CHARS,
+        settings.DOCUMENT_OCR_DPI,
+        settings.DOCUMENT_OCR_LANG,
+    )
+
+
+def page_order(count, priority=()):
+    """
+    Page indexes with the priority pages first (negative indexes count from
+    the end), then the rest in document order.
+    """
+    first = []
+    for index in priority:
+        index = index % count if -count <= index < count else None
+        if index is not None and index not in first:
+            first.append(index)
+    return first + [index for index in range(count) if index not in first]
+
+
+def iter_pdf_pages(path, order, known=None):
+    """
+    Lazily yields PageText for the pages in `order`. At most
+    DOCUMENT_EXTRACTION_WORKERS pages are in flight, so a consumer that stops
+    early leaves the remaining pages untouched. Pages in `known` (index ->
+    text, e.g. page 1 as read by the layout template) are not read again.
+    """
+    args = _page_args()
+    known = known or {}
+    window = settings.DOCUMENT_EXTRACTION_WORKERS
+
+    def read(index):
+        return PageText(index, known[index], 'known') if index in known else extract_page(path, index, *args)
+
+    indexes = iter(order)
+    if len(order) - len(known) < 2 or window < 2:
+        for index in indexes:
+            yield read(index)
+        return
+
+    executor = _get_executor()
+
+    def submit(index):
+        # None means the page is read inline when its turn comes
+        if index in known:
+            return None
+        try:
+            return executor.submit(extract_page, path, index, *args)
+        except BrokenProcessPool:
+            _reset_executor(executor)
+            return None
+
+    pending = deque((index, submit(index)) for index in islice(indexes, window))
+    try:
+        while pending:
+            index, future = pending.popleft()
+            try:
+                page = read(index) if future is None else future.result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge scan); finish inline, rebuild the pool next time
+                _reset_executor(executor)
+                rest = [index] + [queued for queued, _ in pending] + list(indexes)
+                pending.clear()
+                for remaining in rest:
+                    yield read(remaining)
+                return
+            next_index = next(indexes, None)
+            if next_index is not None:
+                pending.append((next_index, submit(next_index)))
+            yield page
+    finally:
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+
+
+def extract_pdf_pages(path, priority=(), budget=None, known=None):
+    """
+    Returns PageText for the pages read, in page order. Pages are read in
+    priority order and reading stops once `budget` characters are collected;
+    the budget is spent in read order, so priority pages are never the ones cut.
+    """
+    pages = []
+    used = 0
+    with closing(iter_pdf_pages(path, page_order(page_count(path), priority), known)) as stream:
+        for page in stream:
+            if budget is not None and len(page.text) > budget - used:
+                page = page._replace(text=page.text[:max(budget - used, 0)])
+            pages.append(page)
+            used += len(page.text) + 1
+            if budget is not None and used >= budget:
+                break
+    return sorted(pages, key=lambda page: page.index)
+
+
+def _spool(file_obj):
+    """
+    Copies an upload to a named temp file so pool workers can open it by path.
+    """
+    suffix = os.path.splitext(file_obj.name)[1]
+    handle = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    with handle:
+        for chunk in file_obj.chunks() if hasattr(file_obj, 'chunks') else [file_obj.read()]:
+            handle.write(chunk)
+    return handle.name
+
+
+def extract_pages(file_obj, document_type=None, budget=None, known=None):
+    """
+    Extracts the text of an uploaded PDF or image as a list of page texts
+    (one entry for an image), at most `budget` characters in total when
+    given. Pages listed for the document type in DOCUMENT_PAGE_PRIORITY are
+    read first; pages in `known` (index -> text) are reused as is. Raises
+    ValueError for unsupported files or when no text could be read.
+    """
+    known = known or {}
+    file_name = file_obj.name.lower()
+    if file_name.endswith(PDF_EXTENSIONS):
+        path = _spool(file_obj)
+        try:
+            pages = extract_pdf_pages(path, settings.DOCUMENT_PAGE_PRIORITY.get(document_type, ()), budget, known)
+        finally:
+            os.unlink(path)
+        texts = [page.text for page in pages]
+    elif file_name.endswith(IMAGE_EXTENSIONS):
+        text = known[0] if 0 in known else ocr_image(Image.open(file_obj), settings.DOCUMENT_OCR_LANG)
+        texts = [text[:budget] if budget is not None else text]
+    else:
+        raise ValueError("Unsupported file type. Only PDF and image files are supported.")
+
+    if not any(text.strip() for text in texts):
+        raise ValueError("Failed to extract text from file.")
+    return texts
+
+
+def extract_text(file_obj, document_type=None, budget=None, known=None):
+    """
+    Same as extract_pages, joined into one string.
+    """
+    return "\n".join(extract_pages(file_obj, document_type, budget, known))
@@ -0,0 +1,335 @@
+import io
+import re
+from collections import namedtuple
+from datetime import date
+
+import pdfplumber
+import pypdfium2
+import pytesseract
+from django.conf import settings
+from PIL import Image
+
+from .extraction import IMAGE_EXTENSIONS, PDF_EXTENSIONS, run_in_pool
+
+# Layout templates for fixed government forms. A field is read from the words
+# printed next to its box label on the first page: pdfplumber word coordinates
+# for digital PDFs, tesseract word boxes for scans and photos (scaled to PDF
+# points). Anchoring on labels rather than absolute coordinates tolerates the
+# small offsets between form revisions and scanner margins. Each box parser
+# returns the schema fields it fills plus a confidence, so the caller can send
+# only the unreadable fields to the LLM. The text of page 1 is returned too, so
+# text extraction does not read the same page again. OCR runs in the
+# extraction process pool, like the OCR of other pages.
+
+Word = namedtuple('Word', ['text', 'x0', 'x1', 'top', 'bottom'])
+# region: 'below' reads the box under the label, 'right' the rest of its line
+Box = namedtuple('Box', ['label', 'region', 'width', 'height', 'parser'])
+# page_text: text of page 1 (text layer or OCR), None when the page was not read
+TemplateResult = namedtuple('TemplateResult', ['fields', 'confidence', 'page_text'])
+
+EMPTY_RESULT = TemplateResult({}, {}, None)
+
+PAGE_WIDTH = 612  # US Letter, in points
+LINE_TOLERANCE = 3
+# Box contents start under the box number ("14."), left of the label words
+LEFT_SLACK = 24
+MIN_WORDS = 30  # fewer words than this on page 1 means there is no usable text layer
+
+_TOKEN_RE = re.compile(r'[^A-Z0-9]')
+_LABEL_TAIL_RE = re.compile(r'^(?:\([^)]*\)\s*)+')
+_DATE_RE = re.compile(r'\b(\d{4})\s*[-/.]?\s*(\d{2})\s*[-/.]?\s*(\d{2})\b')
+_PAY_GRADE_RE = re.compile(r'\b([EWO])\s*-?\s*0?(\d{1,2})\b')
+_SPECIALTY_RE = re.compile(r'^([0-9][0-9A-Z]{2,5})\s+(.+?)(?:\s*[-,]?\s*\d+\s*YRS?\b.*)?$')
+_LIST_SPLIT_RE = re.compile(r'\s*(?://|;|\n)\s*')
+_NONE_RE = re.compile(r'^(NONE|N/?A|NOTHING FOLLOWS)\b', re.IGNORECASE)
+_CONTINUED_RE = re.compile(r'\b(SEE REMARKS|CONT(INUED)?)\b', re.IGNORECASE)
+# "14." or "12.a." / "a." starts the next box's label
+_BOX_NUMBER_RE = re.compile(r'^(\d{1,2}\.([a-z]\.)?|[a-z]\.)$')
+
+BRANCHES = {
+    'ARMY': 'Army',
+    'NAVY': 'Navy',
+    'AIR FORCE': 'Air Force',
+    'MARINE CORPS': 'Marine Corps',
+    'COAST GUARD': 'Coast Guard',
+    'SPACE FORCE': 'Space Force',
+}
+
+# Longest phrases first: "UNDER HONORABLE CONDITIONS" must win over "HONORABLE"
+CHARACTER_OF_SERVICE = (
+    ('UNDER HONORABLE CONDITIONS', 'General (Under Honorable Conditions)'),
+    ('OTHER THAN HONORABLE', 'Other Than Honorable (OTH)'),
+    ('ENTRY LEVEL', 'Entry Level Separation (ELS)'),
+    ('UNCHARACTERIZED', 'Entry Level Separation (ELS)'),
+    ('BAD CONDUCT', 'Bad Conduct'),
+    ('DISHONORABLE', 'Dishonorable'),
+    ('GENERAL', 'General (Under Honorable Conditions)'),
+    ('HONORABLE', 'Honorable'),
+)
+
+
+def _tokens(text):
+    return [token for token in (_TOKEN_RE.sub('', part) for part in text.upper().split()) if token]
+
+
+def _clean(text):
+    return _LABEL_TAIL_RE.sub('', text or '').strip()
+
+
+def _title(text):
+    return ' '.join(part.capitalize() for part in text.split())
+
+
+# Box parsers: text -> (fields, confidence)
+
+def parse_name(text, source):
+    text = _clean(text).splitlines()[0] if _clean(text) else ''
+    if not text:
+        return {}, 0.0
+    last, comma, rest = text.partition(',')
+    if not comma:
+        return {'full_name': _title(text)}, 0.6
+    first = rest.split()[0] if rest.split() else ''
+    return {
+        'full_name': _title(f"{rest.strip()} {last.strip()}"),
+        'first_name': _title(first),
+        'last_name': _title(last.strip()),
+    }, 1.0 if first else 0.6
+
+
+def parse_branch(text, source):
+    upper = _clean(text).upper()
+    for key, name in BRANCHES.items():
+        if key in upper:
+            return {'branch_of_service': name}, 1.0
+    return ({'branch_of_service': _title(upper)}, 0.5) if upper else ({}, 0.0)
+
+
+def parse_pay_grade(text, source):
+    match = _PAY_GRADE_RE.search(_clean(text).upper())
+    if not match:
+        return {}, 0.0
+    return {'pay_grade': f"{match.group(1)}-{int(match.group(2))}"}, 1.0
+
+
+def _parse_date(text):
+    match = _DATE_RE.search(text or '')
+    if not match:
+        return None
+    try:
+        return date(*map(int, match.groups())).isoformat()
+    except ValueError:
+        return None
+
+
+def date_parser(field):
+    def parse(text, source):
+        value = _parse_date(text)
+        return ({field: value}, 1.0) if value else ({}, 0.0)
+    return parse
+
+
+def parse_character(text, source):
+    upper = _clean(text).upper()
+    for phrase, value in CHARACTER_OF_SERVICE:
+        if phrase in upper:
+            return {'character_of_service': value}, 1.0
+    return ({'character_of_service': _title(upper)}, 0.5) if upper else ({}, 0.0)
+
+
+def _list_items(text):
+    items = [item.strip(' ,.') for item in _LIST_SPLIT_RE.split(_clean(text))]
+    return [item for item in items if item and not _NONE_RE.match(item) and not _CONTINUED_RE.fullmatch(item)]
+
+
+def _continued(text):
+    # Long lists spill into the Remarks block, which the template does not read
+    return bool(_CONTINUED_RE.search(text))
+
+
+def parse_specialties(text, source):
+    entries = []
+    for item in _list_items(text.replace('\n', '//')):
+        match = _SPECIALTY_RE.match(item.upper())
+        if match:
+            entries.append({'code': match.group(1), 'title': _title(match.group(2)), 'source': source})
+    if not entries:
+        return {}, 0.0
+    return {'mos_history': entries}, 0.6 if _continued(text) else 0.95
+
+
+def list_parser(field):
+    def parse(text, source):
+        text = _clean(text)
+        if not text:
+            return {}, 0.0
+        items = []
+        for item in _list_items(text.replace('\n', ' ')):
+            name, _, rest = item.partition(',')
+            entry = {'name': _title(name), 'source': source}
+            if field == 'training_courses' and rest.strip():
+                entry['description'] = rest.strip()
+            items.append(entry)
+        # An explicit NONE is a confident empty list
+        return {field: items}, 0.6 if _continued(text) else 0.9
+    return parse
+
+
+TEMPLATES = {
+    'DD214': (
+        Box('NAME LAST', 'below', 260, 20, parse_name),
+        Box('DEPARTMENT COMPONENT AND BRANCH', 'below', 200, 20, parse_branch),
+        Box('PAY GRADE', 'below', 70, 20, parse_pay_grade),
+        Box('DATE ENTERED AD THIS PERIOD', 'right', 200, 0, date_parser('service_start_date')),
+        Box('SEPARATION DATE THIS PERIOD', 'right', 200, 0, date_parser('service_end_date')),
+        Box('PRIMARY SPECIALTY', 'below', 290, 110, parse_specialties),
+        Box('DECORATIONS MEDALS BADGES', 'below', 300, 120, list_parser('awards')),
+        Box('MILITARY EDUCATION', 'below', 280, 120, list_parser('training_courses')),
+        Box('CHARACTER OF SERVICE', 'below', 220, 20, parse_character),
+    ),
+    'DD2586': (
+        Box('NAME LAST', 'below', 260, 20, parse_name),
+        Box('BRANCH OF SERVICE', 'below', 200, 20, parse_branch),
+        Box('PAY GRADE', 'below', 70, 20, parse_pay_grade),
+        Box('PRIMARY SPECIALTY', 'below', 290, 110, parse_specialties),
+    ),
+}
+
+
+def _find_label(words, label):
+    tokens = _tokens(label)
+    word_tokens = [''.join(_tokens(word.text)) for word in words]
+    for start in range(len(words) - len(tokens) + 1):
+        if word_tokens[start] != tokens[0]:
+            continue
+        run = words[start:start + len(tokens)]
+        if word_tokens[start:start + len(tokens)] == tokens and \
+                all(abs(word.top - run[0].top) <= LINE_TOLERANCE for word in run):
+            return Word(label, run[0].x0, run[-1].x1, run[0].top, max(word.bottom for word in run))
+    return None
+
+
+def _region_text(words, anchor, box):
+    if box.region == 'right':
+        selected = [
+            word for word in words
+            if abs(word.top - anchor.top) <= LINE_TOLERANCE and anchor.x1 < word.x0 and word.x1 <= anchor.x1 + box.width
+        ]
+    else:
+        selected = [
+            word for word in words
+            if anchor.bottom - 1 <= word.top <= anchor.bottom + box.height
+            and anchor.x0 - LEFT_SLACK <= word.x0 and word.x1 <= anchor.x0 + box.width
+        ]
+    lines = []
+    for word in sorted(selected, key=lambda word: (word.top, word.x0)):
+        if lines and abs(lines[-1][0] - word.top) <= LINE_TOLERANCE:
+            lines[-1][1].append(word)
+        else:
+            lines.append((word.top, [word]))
+    texts = []
+    for _, line in lines:
+        line.sort(key=lambda word: word.x0)
+        if box.region == 'below' and _BOX_NUMBER_RE.match(line[0].text):
+            break
+        texts.append(' '.join(word.text for word in line))
+    return '\n'.join(texts)
+
+
+def read_template(words, document_type, page_text=None):
+    """
+    Applies the document type's template to page words. Returns TemplateResult
+    with the schema fields read and a confidence per field (0.0 when a box's
+    label was not found or its content could not be parsed).
+    """
+    fields = {}
+    confidence = {}
+    for box in TEMPLATES.get(document_type, ()):
+        anchor = _find_label(words, box.label)
+        values, score = box.parser(_region_text(words, anchor, box), document_type) if anchor else ({}, 0.0)
+        for field, value in values.items():
+            if score > confidence.get(field, -1):
+                fields[field] = value
+                confidence[field] = score
+    return TemplateResult(fields, confidence, page_text)
+
+
+def _ocr_words(image, lang):
+    """
+    OCR word boxes scaled to PDF points, plus the page text rebuilt from the
+    same pass (one line per tesseract line).
+    """
+    scale = PAGE_WIDTH / image.width
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    words = []
+    lines = {}
+    for i, text in enumerate(data['text']):
+        if not text.strip():
+            continue
+        left, top, width, height = data['left'][i], data['top'][i], data['width'][i], data['height'][i]
+        words.append(Word(text, left * scale, (left + width) * scale, top * scale, (top + height) * scale))
+        lines.setdefault((data['block_num'][i], data['par_num'][i], data['line_num'][i]), []).append(text)
+    return words, '\n'.join(' '.join(line) for line in lines.values())
+
+
+def ocr_first_page(data, is_pdf, dpi, lang):
+    """
+    Pool worker: OCR words and text of the first page of a PDF or image given
+    as bytes.
+    """
+    if is_pdf:
+        pdf = pypdfium2.PdfDocument(data)
+        try:
+            image = pdf[0].render(scale=dpi / 72).to_pil()
+        finally:
+            pdf.close()
+    else:
+        image = Image.open(io.BytesIO(data))
+    return _ocr_words(image, lang)
+
+
+def _ocr(file_obj, is_pdf):
+    file_obj.seek(0)
+    return run_in_pool(ocr_first_page, file_obj.read(), is_pdf, settings.DOCUMENT_OCR_DPI, settings.DOCUMENT_OCR_LANG)
+
+
+def page_words(file_obj):
+    """
+    Words of the first page with their boxes in PDF points, from the text
+    layer when there is one and from OCR otherwise. Returns (words,
+    page_text); both are empty for unsupported files.
+    """
+    file_name = file_obj.name.lower()
+    file_obj.seek(0)
+    try:
+        if file_name.endswith(IMAGE_EXTENSIONS):
+            return _ocr(file_obj, False)
+        if not file_name.endswith(PDF_EXTENSIONS):
+            return [], None
+        with pdfplumber.open(file_obj, pages=[1]) as pdf:
+            page = pdf.pages[0]
+            words = [
+                Word(word['text'], float(word['x0']), float(word['x1']), float(word['top']), float(word['bottom']))
+                for word in page.extract_words(keep_blank_chars=False, use_text_flow=True)
+            ]
+            layer_text = page.extract_text() or ''
+        if len(words) >= MIN_WORDS:
+            return words, layer_text
+        ocr_words, ocr_text = _ocr(file_obj, True)
+        # Same choice as extraction.extract_page: whichever reading has more text
+        if len(ocr_text.strip()) <= len(layer_text.strip()):
+            return words, layer_text
+        return ocr_words, ocr_text
+    finally:
+        file_obj.seek(0)
+
+
+def extract_fields(file_obj, document_type):
+    """
+    Reads the fixed boxes of a DD214/DD2586 upload. Returns EMPTY_RESULT for
+    document types without a template.
+    """
+    if document_type not in TEMPLATES:
+        return EMPTY_RESULT
+    words, page_text = page_words(file_obj)
+    return read_template(words, document_type, page_text)
@@ -0,0 +1,94 @@
+import json
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+from django.conf import settings
+from jsonschema import FormatChecker
+from jsonschema.validators import validator_for
+
+# Compiled document schemas. Every schema in settings.SCHEMA_PATHS is read
+# once per process (at app startup), checked against its metaschema and
+# compiled into a validator. The compact JSON sent in extraction prompts is
+# rendered up front, so requests never touch the schema files.
+
+DocumentSchema = namedtuple('DocumentSchema', ['document_type', 'schema', 'prompt', 'validator'])
+
+# Annotations the LLM does not need to fill `form_data`
+PROMPT_OMITTED_KEYS = ('$schema', 'title')
+
+_registry = None
+_lock = threading.Lock()
+
+
+def render_prompt(schema):
+    """
+    Token-minimal JSON for a schema: no whitespace, no metaschema annotations.
+    """
+    trimmed = {key: value for key, value in schema.items() if key not in PROMPT_OMITTED_KEYS}
+    return json.dumps(trimmed, separators=(',', ':'))
+
+
+def compile_schema(document_type, schema):
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return DocumentSchema(
+        document_type=document_type,
+        schema=schema,
+        prompt=render_prompt(schema),
+        validator=cls(schema, format_checker=FormatChecker()),
+    )
+
+
+def _load():
+    compiled = {}
+    for document_type, path in settings.SCHEMA_PATHS.items():
+        with open(path, 'r') as f:
+            compiled[document_type] = compile_schema(document_type, json.load(f))
+    return MappingProxyType(compiled)
+
+
+def load():
+    """
+    Loads and compiles every schema. Raises on a missing or invalid schema, so
+    a broken file stops startup instead of failing uploads.
+    """
+    global _registry
+    with _lock:
+        _registry = _load()
+        partial_prompt.cache_clear()
+    return _registry
+
+
+def get(document_type) -> DocumentSchema:
+    if _registry is None:
+        load()
+    return _registry[document_type]
+
+
+@lru_cache(maxsize=64)
+def partial_prompt(document_type, excluded):
+    """
+    Prompt form of a document schema without the `excluded` properties (a
+    frozenset), for extractions where some fields are already known.
+    """
+    schema = get(document_type).schema
+    properties = {field: spec for field, spec in schema['properties'].items() if field not in excluded}
+    partial = {key: value for key, value in schema.items() if key != 'required'}
+    partial['properties'] = properties
+    return render_prompt(partial)
+
+
+def errors(document_type, instance, partial=False):
+    """
+    Validation error messages for `instance`, shallowest first. With
+    `partial`, missing required properties are not errors (fields like
+    profile_summary are only filled in after extraction).
+    """
+    found = [
+        error for error in get(document_type).validator.iter_errors(instance)
+        if not (partial and error.validator == 'required' and not error.path)
+    ]
+    found.sort(key=lambda error: (len(error.path), list(map(str, error.path))))
+    return [f"{'/'.join(map(str, error.path)) or '(root)'}: {error.message}" for error in found]
@@ -1,3 +1,335 @@
-from django.test import TestCase
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+
+from . import extraction, layouts, schemas
+from .chunking import chunk_pages, merge_form_data, parse_form_data, split_sections
+from .crypt import SEALED_FIELD, decrypt_with_fingerprint, seal_with_fingerprint
+
+FINGERPRINT = 'test-fingerprint'
+
+SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'full_name': {'type': 'string'},
+        'pay_grade': {'type': 'string'},
+        'mos_history': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'code': {'type': 'string'},
+                    'title': {'type': 'string'},
+                    'start_date': {'type': 'string'},
+                    'source': {'type': 'string'},
+                },
+                'required': ['code', 'title', 'source'],
+            },
+        },
+        'skills': {'type': 'array', 'items': {'type': 'string'}},
+    },
+}
+
+
+class ChunkMergeTests(SimpleTestCase):
+    def test_scalars_keep_first_non_empty(self):
+        merged = merge_form_data(SCHEMA, [{'full_name': ''}, {'full_name': 'Jane Doe'}, {'full_name': 'J. Doe'}])
+        self.assertEqual(merged['full_name'], 'Jane Doe')
+
+    def test_arrays_concatenate_and_dedupe(self):
+        merged = merge_form_data(SCHEMA, [
+            {'mos_history': [{'code': '11B', 'title': 'Infantryman', 'source': 'JST'}]},
+            {'mos_history': [
+                {'code': '11b', 'title': 'infantryman', 'source': 'DD214', 'start_date': '2015-01-01'},
+                {'code': '25B', 'title': 'IT Specialist', 'source': 'JST'},
+            ]},
+        ])
+        self.assertEqual(merged['mos_history'], [
+            {'code': '11B', 'title': 'Infantryman', 'source': 'JST', 'start_date': '2015-01-01'},
+            {'code': '25B', 'title': 'IT Specialist', 'source': 'JST'},
+        ])
+
+    def test_scalar_arrays_dedupe(self):
+        merged = merge_form_data(SCHEMA, [{'skills': ['Logistics', 'Leadership']}, {'skills': ['leadership']}])
+        self.assertEqual(merged['skills'], ['Logistics', 'Leadership'])
+
+    def test_empty_and_non_dict_parts(self):
+        self.assertEqual(merge_form_data(SCHEMA, [{'pay_grade': None, 'skills': []}, ['junk']]), {})
+
+    def test_parse_form_data(self):
+        self.assertEqual(parse_form_data('{"form_data": {"a": 1}}'), {'a': 1})
+        self.assertEqual(parse_form_data('note [[[JSON]]]{"form_data": {"a": 2}}[[[/JSON]]]'), {'a': 2})
+        with self.assertRaises(ValueError):
+            parse_form_data('no json here')
+        with self.assertRaises(ValueError):
+            parse_form_data('{"form_data": ["not", "an", "object"]}')
+
+
+class ChunkSplitTests(SimpleTestCase):
+    def test_pages_are_packed_whole(self):
+        self.assertEqual(chunk_pages(['a' * 40, 'b' * 40, 'c' * 40], 100), ['a' * 40 + '\n' + 'b' * 40, 'c' * 40])
+
+    def test_oversized_page_splits_on_sections(self):
+        page = "MILITARY COURSE\n" + "x" * 60 + "\nMILITARY EXPERIENCE\n" + "y" * 60
+        chunks = chunk_pages([page], 100)
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(chunks[1].startswith("MILITARY EXPERIENCE"))
+
+    def test_chunks_respect_size(self):
+        page = "\n".join(f"line {i} " * 5 for i in range(200))
+        self.assertTrue(all(len(chunk) <= 300 for chunk in chunk_pages([page], 300)))
+
+    def test_split_sections(self):
+        self.assertEqual(split_sections("intro\nOTHER LEARNING EXPERIENCES\ndetail"),
+                         ["intro", "OTHER LEARNING EXPERIENCES\ndetail"])
+
+
+class SchemaValidationTests(SimpleTestCase):
+    def test_every_schema_compiles(self):
+        for document_type in ('DD214', 'DD2586', 'JST'):
+            self.assertEqual(schemas.get(document_type).document_type, document_type)
+
+    def test_prompt_is_compact(self):
+        prompt = schemas.get('DD214').prompt
+        self.assertNotIn('\n', prompt)
+        self.assertNotIn('$schema', prompt)
+
+    def test_partial_prompt_excludes_fields(self):
+        prompt = schemas.partial_prompt('DD214', frozenset({'full_name'}))
+        self.assertNotIn('"full_name"', prompt)
+        self.assertIn('"pay_grade"', prompt)
+
+    def test_partial_skips_root_required(self):
+        self.assertEqual(schemas.errors('DD214', {'full_name': 'Jane Doe'}, partial=True), [])
+        self.assertTrue(schemas.errors('DD214', {'full_name': 'Jane Doe'}))
+
+    def test_format_and_nested_errors(self):
+        found = schemas.errors('DD214', {
+            'service_start_date': '2020-13-01',
+            'mos_history': [{'code': '11B'}],
+        }, partial=True)
+        self.assertIn("service_start_date: '2020-13-01' is not a 'date'", found)
+        self.assertIn("mos_history/0: 'title' is a required property", found)
+
+
+class SealTests(SimpleTestCase):
+    def test_round_trip(self):
+        data = {'fingerprint': FINGERPRINT, 'full_name': 'Jane Doe', 'mos_history': [{'code': '11B'}], 'count': 3}
+        sealed = seal_with_fingerprint(data, FINGERPRINT)
+        self.assertEqual(set(sealed), {'fingerprint', SEALED_FIELD})
+        self.assertEqual(decrypt_with_fingerprint(sealed, FINGERPRINT), data)
+
+    def test_large_documents_round_trip(self):
+        data = {'summary': 'veteran ' * 200}
+        self.assertEqual(decrypt_with_fingerprint(seal_with_fingerprint(data, FINGERPRINT), FINGERPRINT), data)
+
+    def test_datetimes_come_back_as_strings(self):
+        created = datetime(2025, 1, 2, 3, 4, 5)
+        opened = decrypt_with_fingerprint(seal_with_fingerprint({'created_at': created}, FINGERPRINT), FINGERPRINT)
+        self.assertEqual(opened['created_at'], str(created))
+
+
+def fake_page(path, index, *args):
+    return extraction.PageText(index, f"page {index}", 'text')
+
+
+class BrokenPool:
+    """
+    Stands in for a ProcessPoolExecutor whose workers died: submit raises, or
+    (with `fail_results`) futures are accepted and then fail.
+    """
+
+    def __init__(self, fail_results=False):
+        self.fail_results = fail_results
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        if not self.fail_results:
+            raise BrokenProcessPool("a worker died")
+        future = Future()
+        future.set_exception(BrokenProcessPool("a worker died"))
+        return future
+
+    def shutdown(self, *args, **kwargs):
+        self.shut_down = True
+
+
+@override_settings(DOCUMENT_EXTRACTION_WORKERS=2)
+class BrokenPoolTests(SimpleTestCase):
+    def read(self, pool):
+        with mock.patch.object(extraction, '_executor', pool), \
+                mock.patch.object(extraction, 'extract_page', side_effect=fake_page):
+            pages = list(extraction.iter_pdf_pages('doc.pdf', [0, 1, 2, 3]))
+            self.assertIsNone(extraction._executor)
+        self.assertFalse(pool.shut_down)
+        return [page.text for page in pages]
+
+    def test_submit_to_broken_pool_reads_inline(self):
+        self.assertEqual(self.read(BrokenPool()), ['page 0', 'page 1', 'page 2', 'page 3'])
+
+    def test_failed_futures_read_inline(self):
+        self.assertEqual(self.read(BrokenPool(fail_results=True)), ['page 0', 'page 1', 'page 2', 'page 3'])
+
+    def test_newer_pool_is_kept(self):
+        newer = BrokenPool()
+        with mock.patch.object(extraction, '_executor', newer):
+            extraction._reset_executor(BrokenPool())
+            self.assertIs(extraction._executor, newer)
+
+
+class PageBudgetTests(SimpleTestCase):
+    def test_page_order(self):
+        self.assertEqual(extraction.page_order(4, (-1, 0)), [3, 0, 1, 2])
+        self.assertEqual(extraction.page_order(3, (0, 0, -3, 2)), [0, 2, 1])
+        self.assertEqual(extraction.page_order(3, (3, -4)), [0, 1, 2])
+        self.assertEqual(extraction.page_order(0, (-1,)), [])
+
+    def extract(self, texts, priority=(), budget=None):
+        read = []
+
+        def stream(path, order, known=None):
+            for index in order:
+                read.append(index)
+                yield extraction.PageText(index, texts[index], 'text')
+
+        with mock.patch.object(extraction, 'page_count', return_value=len(texts)), \
+                mock.patch.object(extraction, 'iter_pdf_pages', side_effect=stream):
+            pages = extraction.extract_pdf_pages('doc.pdf', priority, budget)
+        return read, [(page.index, page.text) for page in pages]
+
+    def test_no_budget_reads_everything(self):
+        read, pages = self.extract(['a' * 10, 'b' * 10])
+        self.assertEqual(read, [0, 1])
+        self.assertEqual(pages, [(0, 'a' * 10), (1, 'b' * 10)])
+
+    def test_stops_at_budget(self):
+        # 10 chars + separator, then 4 more fit
+        read, pages = self.extract(['a' * 10, 'b' * 10, 'c' * 10], budget=15)
+        self.assertEqual(read, [0, 1])
+        self.assertEqual(pages, [(0, 'a' * 10), (1, 'bbbb')])
+
+    def test_exact_fit_stops_before_next_page(self):
+        read, pages = self.extract(['a' * 10, 'b' * 10], budget=11)
+        self.assertEqual(read, [0])
+        self.assertEqual(pages, [(0, 'a' * 10)])
+
+    def test_priority_pages_are_never_cut(self):
+        read, pages = self.extract(['a' * 10, 'b' * 10, 'c' * 10], priority=(-1,), budget=15)
+        self.assertEqual(read, [2, 0])
+        self.assertEqual(pages, [(0, 'aaaa'), (2, 'c' * 10)])
+
+
+def words_at(text, x0, top, char_width=5, height=8):
+    """
+    Synthetic word boxes for `text` printed on one line from (x0, top).
+    """
+    words = []
+    for word in text.split():
+        x1 = x0 + len(word) * char_width
+        words.append(layouts.Word(word, x0, x1, top, top + height))
+        x0 = x1 + char_width
+    return words
+
+
+DD214_WORDS = (
+    words_at("1. NAME (Last, First, Middle)", 20, 100)
+    + words_at("2. DEPARTMENT, COMPONENT AND BRANCH", 300, 100)
+    + words_at("DOE, JANE MARIE", 30, 112)
+    + words_at("ARMY/RA", 310, 112)
+    + words_at("4.a. GRADE, RATE OR RANK", 20, 130)
+    + words_at("b. PAY GRADE", 200, 130)
+    + words_at("SGT", 30, 142)
+    + words_at("E05", 210, 142)
+    + words_at("12.a. DATE ENTERED AD THIS PERIOD 20150115", 20, 170)
+    + words_at("b. SEPARATION DATE THIS PERIOD 20190114", 20, 182)
+    + words_at("11. PRIMARY SPECIALTY (List number, title and years)", 20, 200)
+    + words_at("11B10 INFANTRYMAN - 4 YRS", 30, 212)
+    + words_at("12. RECORD OF SERVICE", 20, 236)
+    + words_at("24. CHARACTER OF SERVICE (Include upgrades)", 20, 300)
+    + words_at("HONORABLE", 30, 312)
+)
+
+
+class LayoutLabelTests(SimpleTestCase):
+    def test_find_label_ignores_punctuation_and_case(self):
+        anchor = layouts._find_label(DD214_WORDS, 'NAME LAST')
+        self.assertEqual((anchor.x0, anchor.top), (35, 100))
+
+    def test_label_must_be_on_one_line(self):
+        words = words_at("PAY", 20, 100) + words_at("GRADE", 40, 120)
+        self.assertIsNone(layouts._find_label(words, 'PAY GRADE'))
+
+    def test_below_region_includes_box_number_slack_and_stops_at_next_box(self):
+        box = layouts.Box('PRIMARY SPECIALTY', 'below', 290, 110, layouts.parse_specialties)
+        anchor = layouts._find_label(DD214_WORDS, box.label)
+        self.assertEqual(layouts._region_text(DD214_WORDS, anchor, box), "11B10 INFANTRYMAN - 4 YRS")
+
+    def test_right_region(self):
+        box = layouts.Box('SEPARATION DATE THIS PERIOD', 'right', 200, 0, None)
+        anchor = layouts._find_label(DD214_WORDS, box.label)
+        self.assertEqual(layouts._region_text(DD214_WORDS, anchor, box), "20190114")
+
+
+class LayoutParserTests(SimpleTestCase):
+    def test_name(self):
+        self.assertEqual(layouts.parse_name("(Last, First, Middle)\nDOE, JANE MARIE", 'DD214'), (
+            {'full_name': 'Jane Marie Doe', 'first_name': 'Jane', 'last_name': 'Doe'}, 1.0,
+        ))
+        self.assertEqual(layouts.parse_name("JANE DOE", 'DD214'), ({'full_name': 'Jane Doe'}, 0.6))
+        self.assertEqual(layouts.parse_name("", 'DD214'), ({}, 0.0))
+
+    def test_pay_grade_and_dates(self):
+        self.assertEqual(layouts.parse_pay_grade("E05", 'DD214'), ({'pay_grade': 'E-5'}, 1.0))
+        parse = layouts.date_parser('service_end_date')
+        self.assertEqual(parse("2019 01 14", 'DD214'), ({'service_end_date': '2019-01-14'}, 1.0))
+        self.assertEqual(parse("20191314", 'DD214'), ({}, 0.0))
+
+    def test_character_prefers_longest_phrase(self):
+        self.assertEqual(
+            layouts.parse_character("UNDER HONORABLE CONDITIONS (GENERAL)", 'DD214'),
+            ({'character_of_service': 'General (Under Honorable Conditions)'}, 1.0),
+        )
+
+    def test_lists_continued_in_remarks_are_less_confident(self):
+        fields, confidence = layouts.parse_specialties("11B10 INFANTRYMAN 4 YRS // SEE REMARKS", 'DD214')
+        self.assertEqual(fields, {'mos_history': [{'code': '11B10', 'title': 'Infantryman', 'source': 'DD214'}]})
+        self.assertEqual(confidence, 0.6)
+
+    def test_explicit_none_is_a_confident_empty_list(self):
+        self.assertEqual(layouts.list_parser('awards')("NONE", 'DD214'), ({'awards': []}, 0.9))
+
+
+class LayoutTemplateTests(SimpleTestCase):
+    def test_read_dd214(self):
+        result = layouts.read_template(DD214_WORDS, 'DD214', 'page one')
+        self.assertEqual(result.fields, {
+            'full_name': 'Jane Marie Doe',
+            'first_name': 'Jane',
+            'last_name': 'Doe',
+            'branch_of_service': 'Army',
+            'pay_grade': 'E-5',
+            'service_start_date': '2015-01-15',
+            'service_end_date': '2019-01-14',
+            'mos_history': [{'code': '11B10', 'title': 'Infantryman', 'source': 'DD214'}],
+            'character_of_service': 'Honorable',
+        })
+        self.assertEqual(result.confidence['mos_history'], 0.95)
+        self.assertEqual(result.page_text, 'page one')
+
+    def test_missing_labels_leave_fields_out(self):
+        result = layouts.read_template(words_at("24. CHARACTER OF SERVICE", 20, 300), 'DD214')
+        self.assertEqual((result.fields, result.confidence), ({}, {}))
+
+    def test_types_without_a_template(self):
+        self.assertIs(layouts.extract_fields(SimpleUploadedFile('jst.pdf', b''), 'JST'), layouts.EMPTY_RESULT)
+
+    def test_scans_are_ocrd_in_the_pool(self):
+        upload = SimpleUploadedFile('dd214.png', b'image bytes')
+        with mock.patch.object(layouts, 'run_in_pool', return_value=(DD214_WORDS, 'ocr text')) as run:
+            result = layouts.extract_fields(upload, 'DD214')
+        self.assertEqual(run.call_args.args[:3], (layouts.ocr_first_page, b'image bytes', False))
+        self.assertEqual((result.fields['pay_grade'], result.page_text), ('E-5', 'ocr text'))